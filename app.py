@@ -1,396 +1,36 @@
-from flask import Flask, request, jsonify, render_template
-import google.generativeai as genai
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
+import atexit
+import hashlib
+import inspect
+import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+from chatbot import config
+from chatbot.admission import AdmissionController, Rejected, client_address
+from chatbot.analytics import ConversationLog
+from chatbot.augment import Augmenter
+from chatbot.budget import TokenBudget, minimum_input_tokens
+from chatbot.cache import ResponseCache, is_cacheable, normalize_message
+from chatbot.coalesce import Coalescer
+from chatbot.context import estimate_tokens
+from chatbot.http_cache import REVALIDATE, CachedBody, StaticAssets
+from chatbot.knowledge import KnowledgeFile
+from chatbot.lazy import Lazy
+from chatbot.metrics import MetricsRegistry, StageTimer
+from chatbot.sessions import SessionStore, new_session_id
+from chatbot.state import create_backend
+from chatbot.stub import StubModel
+from chatbot.upstream import CircuitBreaker, GeminiClient, UpstreamUnavailable
+
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize Flask app
-app = Flask(__name__, static_folder='static')
-
-# Configure the Gemini API
-genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-
-# OLFU Antipolo SHS Information - Enhanced with more details from the provided links
-INFO = {
-    "strands": {
-        "ABM (Accountancy, Business & Management)": (
-            "📊 Focus: Business fundamentals and financial management\n\n"
-            "Core Subjects:\n"
-            "- Principles of Accounting\n"
-            "- Business Mathematics\n"
-            "- Entrepreneurship\n"
-            "- Marketing Principles\n"
-            "- Economics\n\n"
-            "Unique Features:\n"
-            "• Business simulation activities\n"
-            "• Financial literacy programs\n"
-            "• Industry partnerships with local businesses\n\n"
-            "Career Paths:\n"
-            "• Certified Public Accountant\n"
-            "• Business Analyst\n"
-            "• Financial Advisor\n"
-            "• Marketing Director\n"
-            "• Startup Founder"
-        ),
-        "STEM (Science, Technology, Engineering & Mathematics)": (
-            "🔬 Focus: Advanced scientific inquiry and technological innovation\n\n"
-            "Core Subjects:\n"
-            "- Calculus with Analytic Geometry\n"
-            "- General Physics/Chemistry/Biology\n"
-            "- Engineering Design\n"
-            "- Robotics & Programming\n\n"
-            "Unique Features:\n"
-            "• Annual science research fair\n"
-            "• Robotics competition team\n"
-            "• Partnership with engineering universities\n\n"
-            "Career Paths:\n"
-            "• Data Scientist\n"
-            "• Civil Engineer\n"
-            "• Medical Researcher\n"
-            "• AI Developer\n"
-            "• Aerospace Engineer"
-        ),
-        "HumSS (Humanities & Social Sciences)": (
-            "📚 Focus: Cultural understanding and societal systems\n\n"
-            "Core Subjects:\n"
-            "- Philippine Politics & Governance\n"
-            "- World Religions\n"
-            "- Creative Writing\n"
-            "- Community Engagement\n"
-            "- Media & Information Literacy\n\n"
-            "Unique Features:\n"
-            "• Model United Nations program\n"
-            "• School newspaper editorial team\n"
-            "• Community immersion projects\n\n"
-            "Career Paths:\n"
-            "• Human Rights Lawyer\n"
-            "• Clinical Psychologist\n"
-            "• International Diplomat\n"
-            "• Documentary Filmmaker\n"
-            "• Social Media Strategist"
-        ),
-        "GAS (General Academic Strand)": (
-            "🎓 Focus: Flexible multidisciplinary education\n\n"
-            "Sample Electives:\n"
-            "- Disaster Readiness & Risk Reduction\n"
-            "- Applied Economics\n"
-            "- Psychology Electives\n"
-            "- Creative Industries\n\n"
-            "Unique Features:\n"
-            "• Customizable course selection\n"
-            "• College pathway preparation\n"
-            "• Career exploration seminars\n\n"
-            "Career Pathways:\n"
-            "• Broad preparation for:\n"
-            "  - Liberal Arts Degrees\n"
-            "  - Entrepreneurship\n"
-            "  - Technical-Vocational Programs\n"
-            "  - Emerging Industries"
-        )
-    },
-    "requirements": (
-        "Here are the admission requirements:\n\n"
-        "1. Original Grade 10 Report Card (F-138)\n"
-        "2. Original F-137 (claim request letter from OLFU Admissions Office)\n"
-        "3. Original or Certified True Copy of Certificate of Junior High School Completion\n"
-        "4. Original Certificate of Good Moral Character (issued in the current year)\n"
-        "5. Two (2) identical copies of recent studio photo (white background)\n"
-        "6. Clear photocopy of PSA Birth Certificate\n"
-        "7. Original Education Service Contracting (ESC) Certificate / Qualified Voucher Recipient (QVR) Certificate (if coming from private school)"
-    ),
-    "misc_fees": (
-        "Canvas Account: ₱850\n"
-        "   - **Online learning platform access (1 year validity)**\n"
-        "   - **Includes 25GB cloud storage**\n"
-        "   - **Mandatory for all students**\n\n"
-
-        "Application Fee: ₱1500\n"
-        "   - **Non-refundable processing fee**\n"
-        "   - **Covers document verification**\n"
-        "   - **Valid for one academic year**\n\n"
-
-        "Uniform Set: ₱1200\n"
-        "   - **Package includes:**\n"
-        "       • 2 OLFU polo shirts (white & blue)\n"
-        "       • 1 pair of slacks/skirt\n"
-        "       • School necktie/ribbon\n"
-        "       • ID lace with safety breakaway clasp**\n\n"
-
-        "PE Uniform: ₱1000\n"
-        "   - **Package includes:**\n"
-        "       • Moisture-wick OLFU dri-fit shirt\n"
-        "       • Athletic shorts with school logo\n"
-        "       • Drawstring sports bag\n"
-        "   - **Available sizes: XS to XXL**\n"
-        "   - **Replacement cost: ₱650/set**"
-    ),
-    "tuition_fees": (
-        "📌 Senior High School Tuition Fees (Antipolo Campus):\n\n"
-        "MINIMUM REQUIREMENTS TO ENROLL:\n"
-        "Public School Completers | Private School Completers\n"
-        "Application Fee: PHP 500 | PHP 500\n"
-        "Learning Modality Fee* (per semester): PHP 900 | PHP 900\n"
-        "Minimum Down Payment: NONE | PHP 1,500\n"
-        "MINIMUM FEE REQUIRED: PHP 1,400 | PHP 2,900*\n\n"
-        "*SHS Plus students from public schools follow private school completer fees"
-    ),
-    "tuition_breakdown": (
-        "📌 SHS Tuition Computation Examples:\n\n"
-        "A. Voucher Recipient (Public):\n"
-        "Initial Fees: ₱1,400\n"
-        "Total Tuition: ₱17,500 (Fully covered by voucher)\n\n"
-        "B. ESC Grantee (Private):\n"
-        "Initial Fees: ₱2,900\n"
-        "Total Balance: ₱2,000 after voucher\n\n"
-        "C. SHS Plus (Private):\n"
-        "Initial Fees: ₱2,900\n"
-        "Total Balance: ₱18,500\n\n"
-        "D. SHS Plus (Public):\n"
-        "Initial Fees: ₱2,900\n"
-        "Total Balance: ₱15,000\n\n"
-        "E. Non-Voucher Students:\n"
-        "Regular: ₱16,000 balance\n"
-        "Plus: ₱32,500 balance"
-    ),
-    "payment_modes": (
-        "💳 Payment Options:\n\n"
-        "▪ Full Payment (no discounts)\n"
-        "▪ Installment Plans:\n"
-        "  - Semestral (+₱400)\n"
-        "  - Quarterly (+₱800)\n"
-        "  - Monthly (+₱1,200)\n\n"
-        "Voucher billing is processed through DepEd's schedule"
-    ),
-    "enrollment_process": (
-        "📝 Enrollment Process:\n\n"
-        "1. Fill out the Online Registration Form at www.fatima.edu.ph/apply\n"
-        "2. Submit Initial Requirements through the Online Portal\n"
-        "3. Pay Enrollment Fee via online banking or in-person at campus cashier\n"
-        "4. Secure Proof of Payment (receipt/confirmation)\n"
-        "5. Submit Complete Admission Requirements to the Admissions Office\n"
-        "6. Wait for confirmation email and class schedule\n"
-        "7. Attend orientation day for new students"
-    ),
-    "important_dates": (
-        "📅 Important Dates:\n"
-        "Enrollment Period: April 1 - June 30, 2025\n"
-        "Start of Classes: August 5, 2025\n"
-        "Orientation Day: July 15, 2025"
-    ),
-    "contact_info": (
-        "📌 Contact Information:\n"
-        "Address: OLFU Antipolo Campus, Sumulong Highway, Antipolo City\n"
-        "Phone: (02) 8571-2971\n"
-        "Email: shs.admissions@olfu.edu.ph\n"
-        "Facebook: www.facebook.com/olfu.antipolo\n"
-        "Website: www.fatima.edu.ph"
-    ),
-    "scholarships": (
-        "🎓 Available Scholarships:\n\n"
-        "1. Academic Scholarship\n"
-        "2. Athletic Scholarship\n"
-        "3. Financial Aid\n"
-        "4. Honor Students' Scholarship\n"
-        "5. Academic Grants\n"
-        "6. OLFU Tuition Free Promotion\n"
-        "7. Special Talent Grants\n"
-        "8. MD2-MD3 Scholarship\n"
-        "9. Dentist Parent Privilege Grant"
-    ),
-    "scholarship_details": (
-        "📋 Scholarship Requirements:\n\n"
-        "Honor Students' Scholarship:\n"
-        "- Top 1/2 in graduating class\n"
-        "- Submit Grade 12 Report Card\n"
-        "- Certificate of Rank\n"
-        "- Good Moral Certificate\n\n"
-        "Academic Grants:\n"
-        "- Qualifying exam required\n"
-        "- Based on GWA and exam results\n\n"
-        "OLFU Tuition Free Promotion:\n"
-        "- For students with exemplary academic performance\n"
-        "- Covers 100% of tuition fees (excluding miscellaneous fees)\n"
-        "- Renewable every semester based on grades\n\n"
-        "Special Talent Grants:\n"
-        "- Available for students with special talents in arts, music, sports\n"
-        "- Audition/demonstration required\n"
-        "- Partial tuition discount"
-    ),
-    "faqs": (
-        "❓ Frequently Asked Questions:\n\n"
-        "Q: Is there an entrance exam?\nA: No entrance exam required for SHS admission\n\n"
-        "Q: Are installments available?\nA: Yes, with minimal additional fees\n\n"
-        "Q: What is SHS Plus?\nA: Enhanced program with college credits and advanced curriculum\n\n"
-        "Q: Can I shift strands after enrollment?\nA: Yes, within the first two weeks of classes, subject to approval\n\n"
-        "Q: How do I apply for scholarships?\nA: Submit requirements to the Scholarship Office during enrollment\n\n"
-        "Q: Are there dormitories available?\nA: No, but the university can recommend nearby accommodations\n\n"
-        "Q: Do you accept transferees?\nA: Yes, subject to credit evaluation and available slots\n\n"
-        "Q: What are the school hours?\nA: 7:30 AM - 4:30 PM, Monday through Friday"
-    ),
-    "facilities": (
-        "🏫 Campus Facilities:\n"
-        "Library & Learning Resource Center | Medical & Dental Clinic | Computer Laboratories | Science Laboratories | Multimedia Centers | Speech Laboratory | Cafeteria | Student Lounges | Gymnasium & Sports Facilities | Auditorium | Prayer Rooms | Free WiFi Access | Student Activity Centers"
-    ),
-    "learning_modes": (
-        "📚 Learning Modes:\n"
-        "Face-to-Face | Blended Learning | Fully Online (Limited Programs)\n\n"
-        "All modes use Canvas LMS for course materials, assignments, and assessments. Students in all learning modes have access to:\n"
-        "- Digital textbooks and resources\n"
-        "- Recorded lectures and demonstrations\n"
-        "- Online consultation hours with faculty\n"
-        "- Virtual laboratory simulations\n"
-        "- Online assessment tools"
-    ),
-    "shs_voucher_policy": (
-        "🎫 Voucher Policy:\n\n"
-        "Public School Completers:\n"
-        "- Automatic voucher coverage\n"
-        "- Full value: ₱17,500 per year\n"
-        "- Covers full regular SHS tuition\n\n"
-        "Private School Completers:\n"
-        "- Submit ESC/QVR certificate\n"
-        "- ₱14,000 voucher support per year\n"
-        "- Student pays difference of ₱3,500\n\n"
-        "Voucher Application Process:\n"
-        "1. Public school students: Automatic application\n"
-        "2. Private school students: Apply through previous school\n"
-        "3. Submit voucher certificate during enrollment\n"
-        "4. OLFU processes voucher claims directly with DepEd"
-    ),
-    "location_details": (
-        "📍 OLFU Antipolo Campus Location:\n\n"
-        "Full Address:\n"
-        "Our Lady of Fatima University\n"
-        "Sumulong Highway, Sta. Cruz,\n"
-        "Antipolo City, 1870 Rizal\n\n"
-        "Landmarks:\n"
-        "• Near Antipolo Cathedral\n"
-        "• Across Robinsons Place Antipolo\n"
-        "• Adjacent to Ace Hardware Antipolo\n\n"
-        "Transportation Options:\n"
-        "🚌 Jeepneys: Antipolo-Cubao/Marikina routes\n"
-        "🚍 UV Express: Tikling/Sta. Lucia-Padang routes\n"
-        "🚗 Private Vehicles: Accessible via Marcos Highway\n\n"
-        "Parking Information:\n"
-        "• Free parking for students\n"
-        "• Separate areas for motorcycles and cars\n"
-        "• Open 6:00 AM - 8:00 PM daily\n\n"
-        "GPS Coordinates: 14.5844° N, 121.1763° E"
-    ),
-    # New information added from the provided links
-    "shs_vision_mission": (
-        "🔮 Vision & Mission:\n\n"
-        "Vision:\n"
-        "OLFU envisions itself as a globally recognized autonomous academic institution rooted in Christian values, a center of excellence in healthcare and other disciplines, and a provider of quality education that transforms lives and communities.\n\n"
-        "Mission:\n"
-        "OLFU is committed to producing civic-spirited and service-oriented leaders who help in nation building through relevant and progressive research, knowledge development, and community service."
-    ),
-    "shs_plus_program": (
-        "🌟 SHS Plus Program:\n\n"
-        "The SHS Plus Program is OLFU's premium senior high school offering that provides:\n\n"
-        "- College-level courses that earn credits for future degree programs\n"
-        "- Advanced curriculum beyond the basic DepEd requirements\n"
-        "- Specialized mentoring from university professors\n"
-        "- Priority access to university facilities\n"
-        "- Smoother transition to college programs\n"
-        "- Enhanced career readiness and preparation\n\n"
-        "SHS Plus is available for all strands with slightly higher tuition fees than the regular program, but offers significant advantages for students planning to continue to college at OLFU."
-    ),
-    "shs_regular_program": (
-        "📘 Regular SHS Program:\n\n"
-        "The Regular SHS Program follows the standard DepEd curriculum with:\n\n"
-        "- Core subjects required for all strands\n"
-        "- Specialized subjects based on chosen strand\n"
-        "- Work Immersion opportunities\n"
-        "- Research projects\n"
-        "- Complete DepEd requirements for SHS completion\n\n"
-        "The Regular Program is ideal for students who want a solid SHS education at an affordable rate, especially with voucher coverage."
-    ),
-    "student_life": (
-        "🎭 Student Life at OLFU Antipolo:\n\n"
-        "Organizations & Clubs:\n"
-        "- Student Council\n"
-        "- Subject-focused clubs (Math Club, Science Club, etc.)\n"
-        "- Arts and cultural organizations\n"
-        "- Sports teams\n"
-        "- Community service groups\n\n"
-        "Annual Events:\n"
-        "- University Week celebrations\n"
-        "- Intramurals\n"
-        "- Cultural festivals\n"
-        "- Academic competitions\n"
-        "- Career fairs\n\n"
-        "Support Services:\n"
-        "- Guidance counseling\n"
-        "- Academic advising\n"
-        "- Student welfare assistance\n"
-        "- Health services"
-    ),
-    "campus_images": {
-        "logo": "/static/olfu_logo.png"  # Keep only the logo
-    },
-    "application_process": (
-        "🔄 Application Process:\n\n"
-        "1. Online Application\n"
-        "   - Visit: www.fatima.edu.ph/apply-senior-high-school\n"
-        "   - Complete registration form with accurate information\n"
-        "   - Upload required documents\n\n"
-        "2. Application Processing\n"
-        "   - Application review (1-3 business days)\n"
-        "   - Confirmation email with application number\n\n"
-        "3. Admission\n"
-        "   - No entrance exam required\n"
-        "   - Document verification\n"
-        "   - Acceptance letter issuance\n\n"
-        "4. Enrollment\n"
-        "   - Pay initial fees\n"
-        "   - Complete medical requirements\n"
-        "   - Submit original documents\n"
-        "   - Receive student credentials\n\n"
-        "5. Orientation\n"
-        "   - Mandatory for all new students\n"
-        "   - Introduction to university policies\n"
-        "   - Campus tour and facility orientation"
-    ),
-    "voucher_program_details": (
-        "📑 SHS Voucher Program Details:\n\n"
-        "The Senior High School Voucher Program (SHS VP) is a financial assistance program by DepEd that:\n\n"
-        "• Subsidizes tuition and other fees of qualified SHS learners\n"
-        "• Enables more students to access private education\n"
-        "• Has varying amounts based on location and student category\n\n"
-        "OLFU Antipolo Voucher Values:\n"
-        "- Public School Completers: ₱17,500/year\n"
-        "- Private School Completers with ESC: ₱17,500/year\n"
-        "- Private School Completers: ₱14,000/year\n\n"
-        "Application Process:\n"
-        "• Public JHS completers: Automatic qualification\n"
-        "• Private JHS completers: Apply through the ESC system\n"
-        "• ESC grantees: Automatic qualification\n\n"
-        "Important Reminders:\n"
-        "• The voucher is valid for 2 years (SHS duration)\n"
-        "• Non-transferable between students\n"
-        "• Valid only at DepEd-certified SHS providers like OLFU"
-    ),
-    "shs_curriculum": (
-        "📚 SHS Curriculum Overview:\n\n"
-        "Core Curriculum (for all strands):\n"
-        "• Oral Communication\n"
-        "• Reading and Writing\n"
-        "• 21st Century Literature\n"
-        "• Contemporary Philippine Arts\n"
-        "• Media and Information Literacy\n"
-        "• General Mathematics\n"
-        "• Statistics and Probability\n"
-        "• Earth and Life Science\n"
-        "• Physical Science\n"
-        "• Introduction to Philosophy\n"
-        "• Physical Education and Health\n"
-        "• Personal Development\n\n"
-        "Each strand then has specific specialized subjects relevant to their focus area. All students also complete Research/Capstone Projects and Work Immersion modules before graduation."
-    )
-}
+# Initialize Flask app (static files are served by static_file() below, from memory)
+app = Flask(__name__, static_folder=None)
+app.config['MAX_CONTENT_LENGTH'] = config.MAX_BODY_BYTES
 
 # Define system prompt for Gemini
 SYSTEM_PROMPT = """
@@ -430,88 +70,820 @@ Use the information provided to you about OLFU Antipolo's Senior High School pro
 Your purpose is to help students and parents learn about OLFU Antipolo's Senior High School offerings and guide them through the admission process.
 """
 
-# Create a Gemini model
-model = genai.GenerativeModel(
-    model_name="gemini-2.0-flash",
-    generation_config=genai.GenerationConfig(
-        temperature=0.7,
-        top_p=0.95,
-        top_k=40,
-        max_output_tokens=4096,
+
+def on_knowledge_change(compiled):
+    # Cached answers were generated from the previous INFO; only the new version is looked up now
+    RESPONSE_CACHE.clear()
+
+
+# OLFU Antipolo SHS information (INFO) lives in data/info.json; edits are picked up without a
+# redeploy, and the compiled prompt context, section index and intent router are rebuilt once
+KNOWLEDGE = KnowledgeFile(config.INFO_PATH, SYSTEM_PROMPT, check_interval=config.INFO_RELOAD_INTERVAL,
+                          on_change=on_knowledge_change)
+print("Knowledge context ready: version {version}, {sections} sections, {bytes} bytes, ~{tokens} tokens".format(
+    **KNOWLEDGE.current.describe()))
+
+
+def create_model():
+    """Import and configure the Gemini SDK and build the model (or a local stand-in for load tests).
+
+    Returns (model, uses_system_instruction). Runs once, on the first chat that needs Gemini,
+    so routes that never call the model don't pay for importing google.generativeai.
+    """
+    if config.GEMINI_STUB:
+        stub = StubModel(latency=config.GEMINI_STUB_LATENCY,
+                         tokens_per_second=config.GEMINI_STUB_TOKENS_PER_SECOND,
+                         error_rate=config.GEMINI_STUB_ERROR_RATE)
+        return stub, False
+
+    import google.generativeai as genai
+
+    # Configure the Gemini API
+    genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+
+    # Newer SDKs take the system prompt as a system instruction; older ones get it as an opening exchange
+    use_system_instruction = 'system_instruction' in inspect.signature(genai.GenerativeModel).parameters
+    model_options = {"system_instruction": SYSTEM_PROMPT} if use_system_instruction else {}
+
+    model = genai.GenerativeModel(
+        **model_options,
+        model_name="gemini-2.0-flash",
+        generation_config=genai.GenerationConfig(
+            temperature=0.7,
+            top_p=0.95,
+            top_k=40,
+            max_output_tokens=config.MAX_OUTPUT_TOKENS,
+        ),
+        safety_settings=[
+            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+        ],
+    )
+    return model, use_system_instruction
+
+
+# Gemini model, created lazily by create_model() (see warm_up() to build it ahead of traffic)
+MODEL = Lazy(create_model)
+
+# Shared state backend for sessions and cached answers (None keeps them in this process)
+STATE = create_backend(config.STATE_BACKEND)
+
+# Keep chat history per visitor (bounded and evicted when idle) instead of one shared chat
+SESSIONS = SessionStore(
+    max_sessions=config.SESSION_MAX,
+    idle_ttl=config.SESSION_IDLE_TTL,
+    max_turns=config.SESSION_MAX_TURNS,
+    max_tokens=config.SESSION_MAX_TOKENS,
+    backend=STATE,
+)
+
+# Answers to repeated questions, keyed on the normalized message and the knowledge base version
+RESPONSE_CACHE = ResponseCache(
+    max_entries=config.CACHE_MAX_ENTRIES,
+    ttl=config.CACHE_TTL,
+    fuzzy_threshold=config.CACHE_FUZZY_THRESHOLD,
+    shared=STATE,
+)
+
+# Guard Gemini calls with a rate limiter, per-call timeout, retries and a circuit breaker
+UPSTREAM = GeminiClient(
+    rate=config.UPSTREAM_RATE,
+    burst=config.UPSTREAM_BURST,
+    queue_timeout=config.UPSTREAM_QUEUE_TIMEOUT,
+    timeout=config.UPSTREAM_TIMEOUT,
+    max_retries=config.UPSTREAM_MAX_RETRIES,
+    base_delay=config.UPSTREAM_RETRY_BASE_DELAY,
+    max_delay=config.UPSTREAM_RETRY_MAX_DELAY,
+    max_workers=config.UPSTREAM_MAX_WORKERS,
+    chunk_timeout=config.UPSTREAM_CHUNK_TIMEOUT,
+    breaker=CircuitBreaker(
+        failure_threshold=config.BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=config.BREAKER_RESET_TIMEOUT,
     ),
-    safety_settings=[
-        {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-        {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-        {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-        {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-    ],
 )
 
-# Create chat history
-chat = model.start_chat(history=[])
+# Static files with content-hash URLs for templates (asset_url('script.js')), and the rendered
+# index page and /api/campus_images body, kept with their ETags and compressed variants
+ASSETS = StaticAssets(
+    os.path.join(app.root_path, 'static'),
+    max_age=config.STATIC_MAX_AGE,
+    min_compress_bytes=config.COMPRESS_MIN_BYTES,
+    check_interval=config.STATIC_RELOAD_INTERVAL,
+)
+app.jinja_env.globals['asset_url'] = ASSETS.url
+PAGE_CACHE = {}  # name -> (version, CachedBody)
+
+# Shares one Gemini call between identical questions asked while it is running
+COALESCER = Coalescer(max_followers=config.COALESCE_MAX_FOLLOWERS, wait_timeout=config.COALESCE_WAIT_TIMEOUT)
+
+# Per-client rate limits, the message size cap and the in-flight ceiling for chat requests
+ADMISSION = AdmissionController(
+    ip_rate=config.ADMISSION_IP_RATE,
+    ip_burst=config.ADMISSION_IP_BURST,
+    session_rate=config.ADMISSION_SESSION_RATE,
+    session_burst=config.ADMISSION_SESSION_BURST,
+    max_message_chars=config.MAX_MESSAGE_CHARS,
+    max_concurrent=config.ADMISSION_MAX_CONCURRENT,
+    max_clients=config.ADMISSION_MAX_CLIENTS,
+)
+
+# Rules for INFO sections appended to answers (see chatbot/augment.py), compiled once
+AUGMENTER = Augmenter()
+
+# Caps what each Gemini request may send and generate. The input budget is raised to fit the
+# system prompt and the longest message admission accepts, so a question is never cut away.
+MIN_INPUT_TOKENS = minimum_input_tokens(SYSTEM_PROMPT, config.MAX_MESSAGE_CHARS)
+if config.MAX_INPUT_TOKENS < MIN_INPUT_TOKENS:
+    print(f"MAX_INPUT_TOKENS={config.MAX_INPUT_TOKENS} cannot fit the system prompt and a "
+          f"{config.MAX_MESSAGE_CHARS}-character question; using {MIN_INPUT_TOKENS}")
+BUDGET = TokenBudget(
+    max_input_tokens=max(config.MAX_INPUT_TOKENS, MIN_INPUT_TOKENS),
+    factual_output_tokens=config.OUTPUT_TOKENS_FACTUAL,
+    open_output_tokens=config.OUTPUT_TOKENS_OPEN,
+)
+
+# Runs the Gemini calls of /api/chat/batch requests concurrently
+BATCH_EXECUTOR = ThreadPoolExecutor(max_workers=config.BATCH_MAX_CONCURRENCY, thread_name_prefix="batch")
+
+# Words that make a short message a question rather than a reply such as the visitor's name
+_QUESTION_WORDS = frozenset("what whats how when where which who why can could do does is are will may".split())
+
+
+def is_loggable(message, match):
+    """Whether a message may be logged as text: it has no personal details (is_cacheable), and
+    it is not a short reply without intent keywords or a question, which is most likely the name
+    SYSTEM_PROMPT asks visitors for ("Juan Dela Cruz")."""
+    if not is_cacheable(message):
+        return False
+    words = message.lower().split()
+    return (match is not None or "?" in message or len(words) > 4
+            or bool(_QUESTION_WORDS.intersection(words)))
+
+
+def enrich_turn(record):
+    """Writer-thread half of an analytics record: the session id is hashed and the message
+    becomes its normalized form (withheld unless is_loggable) and detected intent."""
+    session_id = record.pop("session_id", None)
+    message = record.pop("message", None) or ""
+    match = KNOWLEDGE.current.router.classify(message) if message else None
+    record["session"] = hashlib.sha256(session_id.encode()).hexdigest()[:12] if session_id else None
+    record["question"] = normalize_message(message) if is_loggable(message, match) else None
+    record["intent"] = match.name if match is not None else None
+    return record
+
+
+# One JSON line per chat turn for offline analysis (python -m chatbot.analytics_report)
+CONVERSATIONS = ConversationLog(
+    config.ANALYTICS_DIR,
+    max_queue=config.ANALYTICS_MAX_QUEUE,
+    batch_size=config.ANALYTICS_BATCH_SIZE,
+    flush_interval=config.ANALYTICS_FLUSH_INTERVAL,
+    max_file_bytes=config.ANALYTICS_MAX_FILE_BYTES,
+    keep_files=config.ANALYTICS_KEEP_FILES,
+    enrich=enrich_turn,
+) if config.ANALYTICS_DIR else None
+if CONVERSATIONS is not None:
+    atexit.register(CONVERSATIONS.close)
+
+# Request metrics, served in Prometheus text format on /metrics
+METRICS = MetricsRegistry()
+CHAT_REQUESTS = METRICS.counter(
+    'chat_requests_total', 'Chat requests by endpoint and how they were answered', ['endpoint', 'route'])
+CHAT_ERRORS = METRICS.counter('chat_errors_total', 'Chat request errors by kind', ['endpoint', 'kind'])
+CHAT_STAGE_SECONDS = METRICS.histogram(
+    'chat_stage_seconds', 'Time spent in each stage of a chat request', ['endpoint', 'stage'])
+PROMPT_BYTES = METRICS.counter('chat_prompt_bytes_total', 'Bytes of turn prompts sent to Gemini', ['endpoint'])
+PROMPT_TOKENS = METRICS.counter(
+    'chat_prompt_tokens_total', 'Estimated tokens of turn prompts sent to Gemini', ['endpoint'])
+PROMPT_TRIMMED = METRICS.counter(
+    'chat_prompt_trimmed_total', 'History turns, sections and question characters cut to fit the token budget',
+    ['endpoint', 'kind'])
+CHAT_REJECTED = METRICS.counter(
+    'chat_rejected_total', 'Chat requests refused by admission control', ['endpoint', 'reason'])
+RESPONSE_BYTES = METRICS.counter('chat_response_bytes_total', 'Bytes of chat answers returned', ['endpoint'])
+RESPONSE_TOKENS = METRICS.counter(
+    'chat_response_tokens_total', 'Estimated tokens of chat answers returned', ['endpoint'])
+HTTP_RESPONSES = METRICS.counter(
+    'http_cached_responses_total', 'Cached pages, static files and JSON served, by status and encoding',
+    ['route', 'status', 'encoding'])
+METRICS.gauge('chat_response_cache', 'Response cache entries and hit/miss counters',
+              RESPONSE_CACHE.stats, labelname='stat')
+METRICS.gauge('chat_sessions_active', 'Chat sessions currently stored', lambda: len(SESSIONS))
+METRICS.gauge('state_backend_errors', 'Session store backend errors', lambda: SESSIONS.errors)
+METRICS.gauge('gemini_upstream', 'Gemini client queue depth, in-flight calls and counters',
+              lambda: {k: v for k, v in UPSTREAM.stats().items() if k != 'breaker_state'},
+              labelname='stat')
+METRICS.gauge('gemini_breaker_state', 'Gemini circuit breaker state (1 for the current state)',
+              lambda: {state: int(UPSTREAM.breaker.state == state) for state in
+                       (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN)},
+              labelname='state')
+METRICS.gauge('chat_admission', 'Chat requests in flight and clients with rate limit state',
+              ADMISSION.stats, labelname='stat')
+METRICS.gauge('chat_coalesced', 'Gemini calls led, calls saved by joining one in flight, and waits that timed out',
+              COALESCER.stats, labelname='stat')
+if CONVERSATIONS is not None:
+    METRICS.gauge('analytics_log', 'Conversation log records queued, written and dropped, and write errors',
+                  CONVERSATIONS.stats, labelname='stat')
+METRICS.gauge('knowledge_prompt_bytes', 'Size of the full knowledge base prompt prefix',
+              lambda: KNOWLEDGE.current.byte_size)
+METRICS.gauge('knowledge_prompt_tokens', 'Estimated tokens of the full knowledge base prompt prefix',
+              lambda: KNOWLEDGE.current.token_estimate)
+METRICS.gauge('knowledge_reloads', 'Knowledge base file reloads and rejected edits',
+              lambda: {"reloads": KNOWLEDGE.reloads, "errors": KNOWLEDGE.reload_errors}, labelname='result')
+METRICS.gauge('augment_rule_hits', 'Answers extended by each augmentation rule', lambda: AUGMENTER.hits,
+              labelname='rule')
+METRICS.gauge('gemini_model_loaded', 'Whether the Gemini model has been created yet', lambda: int(MODEL.loaded))
+
+
+def resolve_session_id(cookie_value, payload):
+    # Browsers carry the session cookie; embeds and API clients may send session_id instead
+    session_id = cookie_value or payload.get('session_id')
+    if isinstance(session_id, str) and 0 < len(session_id) <= 64:
+        return session_id
+    return new_session_id()
+
+
+def get_session_id(payload):
+    return resolve_session_id(request.cookies.get(config.SESSION_COOKIE), payload)
+
+
+def with_session_cookie(response, session_id):
+    response.set_cookie(config.SESSION_COOKIE, session_id, max_age=config.SESSION_IDLE_TTL,
+                        httponly=True, samesite='Lax')
+    return response
+
+
+BUSY_RESPONSE = "I'm answering a lot of questions right now. Please try again in a moment."
+TOO_LONG_RESPONSE = "That message is a bit long for me. Please keep it under {limit} characters."
+
+
+def message_length(message):
+    return len(message) if isinstance(message, str) else 0
+
+
+def admit_client(endpoint, client, session_id, message_chars, cost=1):
+    """Admission slot for a chat request (release it when done); raises Rejected."""
+    try:
+        return ADMISSION.admit(client, session_id, message_chars, cost)
+    except Rejected as e:
+        CHAT_REJECTED.inc(endpoint=endpoint, reason=e.reason)
+        raise
+
+
+def admit_request(endpoint, session_id, message_chars, cost=1):
+    client = client_address(request.remote_addr, request.headers.get('X-Forwarded-For'),
+                            config.TRUSTED_PROXY_HOPS)
+    return admit_client(endpoint, client, session_id, message_chars, cost)
+
+
+def rejection_body(rejection):
+    """JSON for a refused chat request; "response" is shown to the visitor like an answer."""
+    if rejection.reason in ("message_too_long", "body_too_large"):
+        text = TOO_LONG_RESPONSE.format(limit=config.MAX_MESSAGE_CHARS)
+    else:
+        text = BUSY_RESPONSE
+    body = {"error": rejection.reason, "response": text}
+    if rejection.retry_after is not None:
+        body["retry_after"] = int(rejection.retry_after_header)
+    return body
+
+
+def rejected_response(rejection, session_id=None):
+    response = jsonify(rejection_body(rejection))
+    response.status_code = rejection.status
+    if rejection.retry_after is not None:
+        response.headers['Retry-After'] = rejection.retry_after_header
+    return with_session_cookie(response, session_id) if session_id else response
+
+
+def start_chat(history):
+    """Gemini chat replaying these past turns, after the system instructions."""
+    model, use_system_instruction = MODEL.get()
+    if not use_system_instruction:
+        history = list(KNOWLEDGE.current.setup_history) + list(history)
+    return model.start_chat(history=history)
+
+
+def load_history(session_id):
+    """The session's past turns in Gemini format ([] for batch questions, which have no session)."""
+    return SESSIONS.history(session_id) if session_id else []
+
+
+def plan_turn(knowledge, user_message, history):
+    """Prompt, history and output cap for one Gemini turn, trimmed to the token budget."""
+    return BUDGET.plan(knowledge, user_message, history)
+
+
+def send_options(plan):
+    return {"generation_config": {"max_output_tokens": plan.max_output_tokens}}
+
+
+def warm_up():
+    """Create the Gemini model now instead of on the first chat; returns the seconds it took."""
+    MODEL.get()
+    return MODEL.load_seconds
+
+
+def warm_up_in_background():
+    def run():
+        try:
+            print(f"Gemini model ready in {warm_up():.2f}s")
+        except Exception as e:
+            print(f"Gemini warm-up failed: {e}")
+    threading.Thread(target=run, name="gemini-warmup", daemon=True).start()
+
+
+if config.WARMUP_ON_START:
+    warm_up_in_background()
+
+
+def local_answer(knowledge, user_message, history=()):
+    """Answer from INFO (deterministic intents) or the response cache, without calling Gemini.
+
+    Returns (answer, route) with route "intent" or "cache", or (None, None). Gemini answers
+    depend on the conversation before them (the visitor's name, what "that one" refers to), so
+    only answers to opening questions are cached, and only opening questions look them up.
+    """
+    if config.INTENT_ROUTING:
+        routed = knowledge.router.route(user_message)
+        if routed is not None:
+            return routed.answer, "intent"
+    if history:
+        return None, None
+    cached = RESPONSE_CACHE.get(user_message, knowledge.version)
+    return (cached, "cache") if cached is not None else (None, None)
+
+
+def coalesce_key(knowledge, user_message, history=()):
+    """Key under which concurrent askers share a Gemini call; None for questions never shared.
+
+    Same rule as the response cache: the answer to a cacheable opening question (no history
+    before it) may be reused by anyone asking it under the same INFO version.
+    """
+    if not config.COALESCE or history or not is_cacheable(user_message):
+        return None
+    normalized = normalize_message(user_message)
+    return (knowledge.version, normalized) if normalized else None
+
+
+def fallback_answer(knowledge, user_message):
+    """Best local answer while Gemini is unavailable: the INFO text of the closest intent."""
+    match = knowledge.router.classify(user_message)
+    if match is not None and match.answer:
+        return match.answer
+    return ERROR_RESPONSE
+
+
+def remember_answer(knowledge, session_id, user_message, bot_response, cache):
+    """Record the exchange in the session, and cache the answer if `cache` (see local_answer)."""
+    if cache:
+        RESPONSE_CACHE.put(user_message, knowledge.version, bot_response)
+    # Keep the knowledge base out of stored history; this turn's context is not needed again
+    SESSIONS.append(session_id, user_message, bot_response)
+
+
+def response_addons(user_message, bot_response=""):
+    """Canonical INFO text appended to the answer for location and campus questions."""
+    # Only the text information is added, no map or facility images
+    return AUGMENTER.addons(KNOWLEDGE.current.info, user_message, bot_response)
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+ERROR_RESPONSE = "I'm sorry, I'm having trouble processing your request right now. Please try again later."
+
+
+class Turn:
+    """Answers one chat message: locally when possible, else with Gemini (or by waiting for the
+    identical question it is already answering), else with a local fallback.
+
+    Iterate answer() for the answer's parts (pieces as Gemini generates them with stream=True),
+    then call finish() with the whole answer. `route` (intent, cache, model, coalesced or
+    fallback) and `plan` (the PromptPlan sent to Gemini, None unless this request made the call)
+    are set as the answer is produced.
+    """
+
+    def __init__(self, knowledge, session_id, user_message, timer, endpoint):
+        self.knowledge = knowledge
+        self.session_id = session_id
+        self.user_message = user_message
+        self.timer = timer
+        self.endpoint = endpoint
+        self.route = None
+        self.plan = None
+        self.history = []
+
+    def answer(self, stream=False):
+        with self.timer.stage("session"):
+            self.history = load_history(self.session_id)
+        with self.timer.stage("route"):
+            answer, self.route = local_answer(self.knowledge, self.user_message, self.history)
+        if answer is not None:
+            yield answer
+        else:
+            yield from self.ask_model(stream)
+
+    def ask_model(self, stream=False):
+        """Gemini's answer, shared with identical questions asked meanwhile."""
+        flight, leader = COALESCER.join(coalesce_key(self.knowledge, self.user_message, self.history))
+        started = False
+        try:
+            for text in (self._lead(flight, stream) if leader else self._follow(flight, stream)):
+                started = True
+                yield text
+        except UpstreamUnavailable as e:
+            # Only an answer that hasn't started yet can be replaced
+            if started:
+                raise
+            yield self._fall_back(e)
+
+    def _fall_back(self, error):
+        print(f"Gemini unavailable, answering locally: {error}")
+        CHAT_ERRORS.inc(endpoint=self.endpoint, kind="upstream_unavailable")
+        self.route = "fallback"
+        return fallback_answer(self.knowledge, self.user_message)
+
+    def _lead(self, flight, stream):
+        self.route = "model"
+        with COALESCER.lead(flight):
+            # Send only the INFO sections relevant to the question (full context when unsure)
+            with self.timer.stage("prompt"):
+                self.plan = plan_turn(self.knowledge, self.user_message, self.history)
+            # For streams, the time to the first chunk; the rest of the generation is the "stream" stage
+            with self.timer.stage("upstream"):
+                response = UPSTREAM.send_message(start_chat(self.plan.history), self.plan.prompt,
+                                                 stream=stream, **send_options(self.plan))
+                text = None if stream else response.text
+        if stream:
+            with self.timer.stage("stream"):
+                yield from COALESCER.broadcast(flight, (chunk.text for chunk in UPSTREAM.stream(response)))
+        else:
+            COALESCER.share(flight, text)
+            yield text
+
+    def _follow(self, flight, stream):
+        # The same question is being sent to Gemini already: wait for that answer
+        self.route = "coalesced"
+        if stream:
+            with self.timer.stage("stream"):
+                yield from COALESCER.follow(flight)
+        else:
+            with self.timer.stage("upstream"):
+                text = COALESCER.wait(flight)
+            yield text
+
+    @property
+    def cacheable(self):
+        """Whether the answer is a fresh Gemini answer to an opening question (see local_answer)."""
+        return self.route == "model" and not self.history
+
+    def finish(self, bot_response):
+        """Record the exchange in the session; returns the INFO text to append to the answer."""
+        with self.timer.stage("session"):
+            remember_answer(self.knowledge, self.session_id, self.user_message, bot_response, self.cacheable)
+        with self.timer.stage("postprocess"):
+            return response_addons(self.user_message, bot_response)
+
+
+def answer_chat(session_id, user_message, timer, endpoint="chat"):
+    """Answer one message; returns (bot_response, route, plan), with route "error" if it failed."""
+    turn = Turn(KNOWLEDGE.current, session_id, user_message, timer, endpoint)
+    try:
+        bot_response = "".join(turn.answer())
+        bot_response += turn.finish(bot_response)
+        route = turn.route
+    except Exception as e:
+        print(f"Error with Gemini API: {e}")
+        CHAT_ERRORS.inc(endpoint=endpoint, kind=type(e).__name__)
+        bot_response, route = ERROR_RESPONSE, "error"
+    return bot_response, route, turn.plan
+
+
+def observe_stages(endpoint, timer, detail):
+    for stage, seconds in timer.stages.items():
+        CHAT_STAGE_SECONDS.observe(seconds, endpoint=endpoint, stage=stage)
+    total = timer.total
+    CHAT_STAGE_SECONDS.observe(total, endpoint=endpoint, stage="total")
+    if config.SLOW_REQUEST_SECONDS and total >= config.SLOW_REQUEST_SECONDS:
+        print(f"Slow {endpoint} request: {total:.2f}s, {detail}, {timer.breakdown()}")
+
+
+def record_chat(endpoint, timer, route, plan, bot_response, session_id, user_message):
+    """Count a finished chat request in the metrics and analytics log, and log it if it was slow."""
+    CHAT_REQUESTS.inc(endpoint=endpoint, route=route)
+    prompt_bytes = prompt_tokens = 0
+    if plan is not None:
+        prompt_bytes, prompt_tokens = len(plan.prompt.encode('utf-8')), estimate_tokens(plan.prompt)
+        PROMPT_BYTES.inc(prompt_bytes, endpoint=endpoint)
+        PROMPT_TOKENS.inc(prompt_tokens, endpoint=endpoint)
+        record_trims(endpoint, plan)
+    response_bytes = len(bot_response.encode('utf-8'))
+    RESPONSE_BYTES.inc(response_bytes, endpoint=endpoint)
+    RESPONSE_TOKENS.inc(estimate_tokens(bot_response), endpoint=endpoint)
+    observe_stages(endpoint, timer, f"route={route}")
+    log_turn(endpoint, timer, route, session_id, user_message, prompt_bytes=prompt_bytes,
+             prompt_tokens=prompt_tokens, response_bytes=response_bytes, trimmed=bool(trim_report(plan)))
+
+
+def log_turn(endpoint, timer, route, session_id, user_message, **sizes):
+    """Queue the analytics record of one answered message (normalized on the writer thread)."""
+    if CONVERSATIONS is None:
+        return
+    CONVERSATIONS.record(endpoint=endpoint, route=route, session_id=session_id, message=user_message,
+                         latency_ms=round(timer.total * 1000, 1),
+                         stages={stage: round(seconds * 1000, 1) for stage, seconds in timer.stages.items()},
+                         **sizes)
+
+
+def record_trims(endpoint, plan):
+    for kind, amount in plan.trimmed.items():
+        PROMPT_TRIMMED.inc(len(amount) if isinstance(amount, list) else amount, endpoint=endpoint, kind=kind)
+
+
+def trim_report(plan):
+    """What the token budget left out of the prompt, for the response body ({} if nothing)."""
+    return dict(plan.trimmed) if plan is not None else {}
+
+
+def parse_chat(payload):
+    """The message of a /api/chat or /api/chat/stream body, or (None, error) when it is unusable."""
+    if not isinstance(payload, dict):
+        return None, "Request body must be a JSON object"
+    message = payload.get('message', '')
+    if not isinstance(message, str):
+        return None, "message must be text"
+    return message, None
+
+
+def parse_batch(payload):
+    """The batch's messages, or (None, error) when the request body is unusable."""
+    messages = payload.get('messages') if isinstance(payload, dict) else None
+    if not isinstance(messages, list) or not messages:
+        return None, "messages must be a non-empty list"
+    if len(messages) > config.BATCH_MAX_MESSAGES:
+        return None, f"at most {config.BATCH_MAX_MESSAGES} messages per batch"
+    return messages, None
+
+
+def batch_questions(messages):
+    """Distinct questions in the batch, in first-seen order; blank or non-text items are skipped."""
+    return list(dict.fromkeys(message.strip() for message in messages
+                              if isinstance(message, str) and message.strip()))
+
+
+def ask_gemini(knowledge, user_message):
+    """Answer one standalone question with Gemini, falling back locally when it is unavailable."""
+    turn = Turn(knowledge, None, user_message, StageTimer(), "batch")
+    try:
+        bot_response = "".join(turn.ask_model())
+    except Exception as e:
+        print(f"Error with Gemini API: {e}")
+        return ERROR_RESPONSE, "error"
+    if turn.plan is not None:
+        record_trims("batch", turn.plan)
+    return bot_response, turn.route
+
+
+# Per-item status in batch results for each way a question can be answered
+BATCH_STATUS = {"intent": "ok", "cache": "ok", "model": "ok", "coalesced": "ok", "fallback": "fallback",
+                "error": "error", "busy": "busy"}
+
+
+def local_answers(knowledge, questions):
+    """{question: (answer, route)} for the batch questions answered without Gemini."""
+    answers = {}
+    for question in questions:
+        answer, route = local_answer(knowledge, question)
+        if answer is not None:
+            answers[question] = (answer, route)
+    return answers
+
+
+def batch_results(knowledge, messages, answers):
+    """Per-message results in request order from {question: (bot_response, route)}."""
+    finished = {}
+    for question, (bot_response, route) in answers.items():
+        if route == "model":
+            RESPONSE_CACHE.put(question, knowledge.version, bot_response)
+        if route not in ("error", "busy"):
+            bot_response += response_addons(question, bot_response)
+        finished[question] = {"response": bot_response, "status": BATCH_STATUS[route], "route": route}
+    invalid = {"response": "", "status": "invalid", "route": None}
+    return [finished.get(message.strip(), invalid) if isinstance(message, str) else invalid
+            for message in messages]
+
+
+def record_batch(endpoint, timer, messages, results):
+    for message, result in zip(messages, results):
+        CHAT_REQUESTS.inc(endpoint=endpoint, route=result["route"] or "invalid")
+        response_bytes = len(result["response"].encode('utf-8'))
+        RESPONSE_BYTES.inc(response_bytes, endpoint=endpoint)
+        RESPONSE_TOKENS.inc(estimate_tokens(result["response"]), endpoint=endpoint)
+        if result["route"] is not None:
+            # Batch items share the request's latency and have no session
+            log_turn(endpoint, timer, result["route"], None, message, response_bytes=response_bytes)
+    observe_stages(endpoint, timer, f"{len(results)} messages")
+
+
+def cached_page(name, version, build):
+    """CachedBody for this version of a page, built by `build()` when the version changes."""
+    cached = PAGE_CACHE.get(name)
+    if cached is None or cached[0] != version:
+        cached = PAGE_CACHE[name] = (version, build())
+    return cached[1]
+
+
+def cached_response(route, entry, cache_control=None):
+    """Send a CachedBody: 304 if the client has it, otherwise the best encoding it accepts."""
+    encoding, body, etag = entry.negotiate(request.headers.get('Accept-Encoding'))
+    if entry.not_modified(request.headers.get('If-None-Match')):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=entry.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = cache_control or entry.cache_control
+    if entry.compressible:
+        response.vary.add('Accept-Encoding')
+    HTTP_RESPONSES.inc(route=route, status=response.status_code, encoding=encoding or "identity")
+    return response
 
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    # Rendered once per static assets version, since the page links to their fingerprinted URLs
+    ASSETS.refresh()
+    entry = cached_page('index', ASSETS.version, lambda: CachedBody(
+        render_template('index.html').encode('utf-8'), 'text/html', REVALIDATE, config.COMPRESS_MIN_BYTES))
+    return cached_response('index', entry)
+
+
+@app.route('/static/<path:filename>')
+def static_file(filename):
+    found = ASSETS.get(filename)
+    if found is None:
+        return jsonify({"error": "Not found"}), 404
+    entry, cache_control = found
+    return cached_response('static', entry, cache_control)
 
 
 @app.route('/api/chat', methods=['POST'])
 def chat_endpoint():
-    user_message = request.json.get('message', '')
-
-    # Format our knowledge base as context
-    context = "Information about OLFU Antipolo Senior High School:\n\n"
-    for key, value in INFO.items():
-        if isinstance(value, dict):
-            context += f"{key}:\n"
-            for sub_key, sub_value in value.items():
-                context += f"  {sub_key}: {sub_value}\n\n"
-        else:
-            context += f"{key}: {value}\n\n"
+    timer = StageTimer()
+    payload = request.get_json(silent=True)
+    user_message, error = parse_chat(payload)
+    if error:
+        return jsonify({"error": error}), 400
+    session_id = get_session_id(payload)
+    try:
+        slot = admit_request("chat", session_id, message_length(user_message))
+    except Rejected as e:
+        return rejected_response(e, session_id)
 
-    # Create prompt with context and system instructions
-    prompt = f"""
-    {SYSTEM_PROMPT}
+    with slot:
+        bot_response, route, plan = answer_chat(session_id, user_message, timer)
 
-    Here is information about OLFU Antipolo Senior High School that you should use to answer:
-    {context}
+    # Keep only the logo image, no facility or location images
+    images = []
 
-    User question: {user_message}
-    """
+    with timer.stage("serialize"):
+        body = {"response": bot_response, "images": images, "session_id": session_id}
+        trimmed = trim_report(plan)
+        if trimmed:
+            body["trimmed"] = trimmed
+        response = with_session_cookie(jsonify(body), session_id)
+    record_chat("chat", timer, route, plan, bot_response, session_id, user_message)
+    return response
 
-    # Get response from Gemini
-    try:
-        response = chat.send_message(prompt)
-        bot_response = response.text
 
-        # Keep only the logo image, no facility or location images
-        images = []
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream_endpoint():
+    """Same as /api/chat, but streams the answer as Server-Sent Events while Gemini generates it.
 
-        # Check if the response should include location information
-        if any(location_term in user_message.lower() for location_term in
-               ["location", "address", "where", "map", "directions", "how to get there"]):
-            # Only include the text information, no map image
-            bot_response += f"\n\nHere's our exact location information:\n{INFO['location_details']}"
+    Events: "chunk" ({"text"}) for each piece of the answer, then "done" ({"addons", "images",
+    "session_id", "trimmed"}) with the text to append, or "error" ({"response"}) if generation failed.
+    """
+    timer = StageTimer()
+    payload = request.get_json(silent=True)
+    user_message, error = parse_chat(payload)
+    if error:
+        return jsonify({"error": error}), 400
+    session_id = get_session_id(payload)
+    try:
+        slot = admit_request("stream", session_id, message_length(user_message))
+    except Rejected as e:
+        return rejected_response(e, session_id)
+    knowledge = KNOWLEDGE.current
+
+    def generate():
+        turn = Turn(knowledge, session_id, user_message, timer, "stream")
+        parts = []
+        try:
+            for text in turn.answer(stream=True):
+                parts.append(text)
+                yield sse_event("chunk", {"text": text})
+            bot_response = "".join(parts)
+            addons = turn.finish(bot_response)
+            yield sse_event("done", {
+                "addons": addons,
+                "images": [],
+                "session_id": session_id,
+                "trimmed": trim_report(turn.plan),
+            })
+            record_chat("stream", timer, turn.route, turn.plan, bot_response + addons, session_id, user_message)
+        except Exception as e:
+            print(f"Error with Gemini API: {e}")
+            CHAT_ERRORS.inc(endpoint="stream", kind=type(e).__name__)
+            yield sse_event("error", {"response": ERROR_RESPONSE})
+            record_chat("stream", timer, "error", turn.plan, ERROR_RESPONSE, session_id, user_message)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # Held until the stream ends or the client goes away, even if generate() never starts
+    response.call_on_close(slot.release)
+    return with_session_cookie(response, session_id)
+
+
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch_endpoint():
+    """Answer a list of standalone questions in one request (admissions kiosks, integrations).
+
+    Body: {"messages": [text, ...]}. Identical questions are answered once, intent and cache
+    hits locally, and the rest by Gemini concurrently (still through the rate limiter). Batch
+    questions have no conversation history and don't touch the visitor's session. Returns
+    {"results": [{"response", "status", "route"}, ...]} in request order, where status is ok,
+    fallback, error or invalid. Admission control charges the client one request per distinct
+    question, so a batch buys no more Gemini calls than the same questions sent one by one.
+    """
+    timer = StageTimer()
+    messages, error = parse_batch(request.get_json(silent=True))
+    if error:
+        return jsonify({"error": error}), 400
+    questions = batch_questions(messages)
+    try:
+        slot = admit_request("batch", None, max(map(message_length, messages)), cost=max(1, len(questions)))
+    except Rejected as e:
+        return rejected_response(e)
+    knowledge = KNOWLEDGE.current
+
+    with slot:
+        with timer.stage("route"):
+            answers = local_answers(knowledge, questions)
+        pending = [question for question in questions if question not in answers]
+        with timer.stage("upstream"):
+            answers.update(zip(pending, BATCH_EXECUTOR.map(lambda question: ask_gemini(knowledge, question),
+                                                           pending)))
+    with timer.stage("postprocess"):
+        results = batch_results(knowledge, messages, answers)
+    with timer.stage("serialize"):
+        response = jsonify({"results": results})
+    record_batch("batch", timer, messages, results)
+    return response
+
+
+@app.route('/api/chat/reset', methods=['POST'])
+def chat_reset_endpoint():
+    """Forget the visitor's conversation (the widget's "clear history") and start a new session.
+
+    The stored history is deleted and the cookie gets a fresh session id, so the old turns are
+    never replayed to Gemini even if the session store couldn't be reached.
+    """
+    payload = request.get_json(silent=True)
+    SESSIONS.reset(get_session_id(payload if isinstance(payload, dict) else {}))
+    session_id = new_session_id()
+    return with_session_cookie(jsonify({"session_id": session_id}), session_id)
 
-        # Check if the user is asking about campus images or facilities
-        if any(image_term in user_message.lower() for image_term in
-               ["campus", "building", "facilities", "look like", "pictures", "photos", "images"]):
-            # Only include the text information, no facility images
-            bot_response += f"\n\nHere's information about our campus facilities:\n{INFO['facilities']}"
 
+@app.route('/api/warmup', methods=['GET', 'POST'])
+def warmup_endpoint():
+    """Create the Gemini model ahead of the first chat, e.g. from a ping right after a deploy."""
+    try:
+        warm_up()
     except Exception as e:
-        print(f"Error with Gemini API: {e}")
-        bot_response = "I'm sorry, I'm having trouble processing your request right now. Please try again later."
-        images = []
+        print(f"Gemini warm-up failed: {e}")
+        return jsonify({"ready": False}), 503
+    return jsonify({"ready": True, "load_seconds": round(MODEL.load_seconds, 3)})
+
 
-    return jsonify({"response": bot_response, "images": images})
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
 
 
 # Modify the campus_images endpoint to only return the logo
 @app.route('/api/campus_images', methods=['GET'])
 def campus_images():
-    return jsonify({"images": {"logo": INFO["campus_images"]["logo"]}})
+    # The body only changes with the knowledge base version, so it is built once per version
+    knowledge = KNOWLEDGE.current
+    entry = cached_page('campus_images', knowledge.version, lambda: CachedBody(
+        json.dumps({"images": {"logo": knowledge.info.get("campus_images", {}).get("logo")}}).encode('utf-8'),
+        'application/json', f"public, max-age={config.CAMPUS_IMAGES_MAX_AGE}", config.COMPRESS_MIN_BYTES))
+    return cached_response('campus_images', entry)
 
 
 # Create setup function to prepare directories and files
@@ -0,0 +1,396 @@
+"""ASGI entry point with async chat endpoints, for serving many slow Gemini calls per process.
+
+    pip install uvicorn asgiref
+    uvicorn asgi:application
+
+/api/chat, /api/chat/stream and /api/chat/batch are handled here with the async Gemini client,
+so a waiting question holds no worker thread. At most ASYNC_MAX_CONCURRENCY Gemini calls run at once and
+up to ASYNC_MAX_QUEUE more may wait for a slot; anything beyond that gets a 503. All other
+routes are passed to the Flask app when asgiref is installed.
+
+Set GEMINI_STUB=1 (and GEMINI_STUB_LATENCY, GEMINI_STUB_ERROR_RATE) to load-test without calling
+Gemini; bench/load_test.py does this for /api/chat in-process.
+"""
+import asyncio
+import json
+
+from werkzeug.http import dump_cookie, parse_cookie
+
+import app as chatbot_app
+from chatbot import config
+from chatbot.admission import Rejected, client_address
+from chatbot.limits import AsyncConcurrencyLimiter, QueueFull
+from chatbot.metrics import StageTimer
+from chatbot.upstream import UpstreamUnavailable
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:
+    WsgiToAsgi = None
+
+BUSY_RESPONSE = chatbot_app.BUSY_RESPONSE
+MAX_BODY_BYTES = config.MAX_BODY_BYTES
+
+# The Flask app's coalescer, so sync and async requests for the same question share one call
+COALESCER = chatbot_app.COALESCER
+
+# Async requests wait in LIMITER's queue rather than holding a thread, so the admission ceiling
+# under ASGI covers the queue too (see ADMISSION_MAX_CONCURRENT_ASYNC)
+chatbot_app.ADMISSION.max_concurrent = config.ADMISSION_MAX_CONCURRENT_ASYNC
+
+LIMITER = AsyncConcurrencyLimiter(
+    max_concurrent=config.ASYNC_MAX_CONCURRENCY,
+    max_queue=config.ASYNC_MAX_QUEUE,
+    queue_timeout=config.ASYNC_QUEUE_TIMEOUT,
+)
+
+chatbot_app.METRICS.gauge(
+    'asgi_chat_slots', 'Async chat Gemini slots in use, queued and rejected',
+    lambda: {"in_flight": LIMITER.in_flight, "waiting": LIMITER.waiting, "rejected": LIMITER.rejected},
+    labelname='stat')
+
+flask_application = WsgiToAsgi(chatbot_app.app) if WsgiToAsgi is not None else None
+
+
+async def run_state(func, *args):
+    """Call a function that reads or writes sessions or cached answers. With a SQLite or Redis
+    STATE_BACKEND that is blocking I/O, so it runs in a worker thread instead of stalling every
+    request on the event loop; the in-process store is called directly."""
+    if chatbot_app.STATE is None:
+        return func(*args)
+    return await asyncio.to_thread(func, *args)
+
+
+class BodyTooLarge(Exception):
+    """The request body is over MAX_BODY_BYTES."""
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise BodyTooLarge()
+        if not message.get("more_body"):
+            return body
+
+
+def request_cookie(scope, name):
+    for header, value in scope.get("headers", []):
+        if header == b"cookie":
+            cookie = parse_cookie(value.decode("latin-1")).get(name)
+            if cookie is not None:
+                return cookie
+    return None
+
+
+def scope_client(scope):
+    forwarded_for = None
+    for header, value in scope.get("headers", []):
+        if header == b"x-forwarded-for":
+            forwarded_for = value.decode("latin-1")
+    client = scope.get("client")
+    return client_address(client[0] if client else None, forwarded_for, config.TRUSTED_PROXY_HOPS)
+
+
+def session_cookie_header(session_id):
+    cookie = dump_cookie(config.SESSION_COOKIE, session_id, max_age=config.SESSION_IDLE_TTL,
+                         httponly=True, samesite='Lax')
+    return (b"set-cookie", cookie.encode("latin-1"))
+
+
+async def send_json(send, status, data, headers=()):
+    body = json.dumps(data).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode())] + list(headers),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_rejection(send, rejection, session_id=None):
+    headers = [session_cookie_header(session_id)] if session_id else []
+    if rejection.retry_after is not None:
+        headers.append((b"retry-after", rejection.retry_after_header.encode()))
+    await send_json(send, rejection.status, chatbot_app.rejection_body(rejection), headers)
+
+
+async def read_payload(receive, send, endpoint):
+    """The request's JSON object, or None once the request has been answered with 413 (body over
+    MAX_BODY_BYTES) or 400 (not a JSON object)."""
+    try:
+        body = await read_body(receive)
+    except BodyTooLarge:
+        rejection = Rejected("body_too_large", status=413)
+        chatbot_app.CHAT_REJECTED.inc(endpoint=endpoint, reason=rejection.reason)
+        await send_rejection(send, rejection)
+        return None
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict):
+        await send_json(send, 400, {"error": "Request body must be a JSON object"})
+        return None
+    return payload
+
+
+async def read_chat_request(scope, receive, send, endpoint):
+    """(user_message, session_id), or None once the request has been answered with 413 or 400,
+    as Flask does for /api/chat (see read_payload() and app.parse_chat())."""
+    payload = await read_payload(receive, send, endpoint)
+    if payload is None:
+        return None
+    user_message, error = chatbot_app.parse_chat(payload)
+    if error:
+        await send_json(send, 400, {"error": error})
+        return None
+    session_id = chatbot_app.resolve_session_id(request_cookie(scope, config.SESSION_COOKIE), payload)
+    return user_message, session_id
+
+
+class AsyncTurn(chatbot_app.Turn):
+    """app.Turn for the async endpoints: answer() and ask_model() are async generators,
+    Gemini calls are awaited holding a LIMITER slot (for streams, until the last chunk) and
+    session and cache access goes through run_state()."""
+
+    async def answer(self, stream=False):
+        with self.timer.stage("session"):
+            self.history = await run_state(chatbot_app.load_history, self.session_id)
+        with self.timer.stage("route"):
+            answer, self.route = await run_state(chatbot_app.local_answer, self.knowledge, self.user_message,
+                                                 self.history)
+        if answer is not None:
+            yield answer
+        else:
+            async for text in self.ask_model(stream):
+                yield text
+
+    async def ask_model(self, stream=False):
+        flight, leader = COALESCER.join(
+            chatbot_app.coalesce_key(self.knowledge, self.user_message, self.history))
+        started = False
+        try:
+            async for text in (self._lead(flight, stream) if leader else self._follow(flight, stream)):
+                started = True
+                yield text
+        except UpstreamUnavailable as e:
+            if started:
+                raise
+            yield self._fall_back(e)
+
+    async def _lead(self, flight, stream):
+        self.route = "model"
+        with COALESCER.lead(flight):
+            with self.timer.stage("prompt"):
+                self.plan = chatbot_app.plan_turn(self.knowledge, self.user_message, self.history)
+            async with LIMITER:
+                with self.timer.stage("upstream"):
+                    response = await chatbot_app.UPSTREAM.send_message_async(
+                        chatbot_app.start_chat(self.plan.history), self.plan.prompt, stream=stream,
+                        **chatbot_app.send_options(self.plan))
+                    text = None if stream else response.text
+                if stream:
+                    chunks = chatbot_app.UPSTREAM.stream_async(response)
+                    with self.timer.stage("stream"):
+                        async for text in COALESCER.broadcast_async(flight, (chunk.text async for chunk in chunks)):
+                            yield text
+        if not stream:
+            COALESCER.share(flight, text)
+            yield text
+
+    async def _follow(self, flight, stream):
+        # Followers wait for the leader's answer without taking a Gemini slot
+        self.route = "coalesced"
+        if stream:
+            with self.timer.stage("stream"):
+                async for text in COALESCER.follow_async(flight):
+                    yield text
+        else:
+            with self.timer.stage("upstream"):
+                text = await COALESCER.wait_async(flight)
+            yield text
+
+    async def finish(self, bot_response):
+        with self.timer.stage("session"):
+            await run_state(chatbot_app.remember_answer, self.knowledge, self.session_id, self.user_message,
+                            bot_response, self.cacheable)
+        with self.timer.stage("postprocess"):
+            return chatbot_app.response_addons(self.user_message, bot_response)
+
+
+async def chat_endpoint(scope, receive, send):
+    timer = StageTimer()
+    chat_request = await read_chat_request(scope, receive, send, "asgi_chat")
+    if chat_request is None:
+        return
+    user_message, session_id = chat_request
+    try:
+        slot = chatbot_app.admit_client("asgi_chat", scope_client(scope), session_id,
+                                        chatbot_app.message_length(user_message))
+    except Rejected as e:
+        await send_rejection(send, e, session_id)
+        return
+    with slot:
+        turn = AsyncTurn(chatbot_app.KNOWLEDGE.current, session_id, user_message, timer, "asgi_chat")
+        status, headers = 200, [session_cookie_header(session_id)]
+
+        try:
+            bot_response = "".join([text async for text in turn.answer()])
+            bot_response += await turn.finish(bot_response)
+            route = turn.route
+        except QueueFull:
+            status = 503
+            headers.append((b"retry-after", b"1"))
+            bot_response, route = BUSY_RESPONSE, "busy"
+        except Exception as e:
+            print(f"Error with Gemini API: {e}")
+            chatbot_app.CHAT_ERRORS.inc(endpoint="asgi_chat", kind=type(e).__name__)
+            bot_response, route = chatbot_app.ERROR_RESPONSE, "error"
+
+        with timer.stage("serialize"):
+            body = {"response": bot_response, "images": [], "session_id": session_id}
+            trimmed = chatbot_app.trim_report(turn.plan)
+            if trimmed:
+                body["trimmed"] = trimmed
+            await send_json(send, status, body, headers)
+    chatbot_app.record_chat("asgi_chat", timer, route, turn.plan, bot_response, session_id, user_message)
+
+
+async def chat_stream_endpoint(scope, receive, send):
+    timer = StageTimer()
+    chat_request = await read_chat_request(scope, receive, send, "asgi_stream")
+    if chat_request is None:
+        return
+    user_message, session_id = chat_request
+    try:
+        slot = chatbot_app.admit_client("asgi_stream", scope_client(scope), session_id,
+                                        chatbot_app.message_length(user_message))
+    except Rejected as e:
+        await send_rejection(send, e, session_id)
+        return
+    with slot:
+        turn = AsyncTurn(chatbot_app.KNOWLEDGE.current, session_id, user_message, timer, "asgi_stream")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream; charset=utf-8"),
+                        (b"cache-control", b"no-cache"),
+                        (b"x-accel-buffering", b"no"),
+                        session_cookie_header(session_id)],
+        })
+
+        async def emit(event, data):
+            await send({"type": "http.response.body", "body": chatbot_app.sse_event(event, data).encode(),
+                        "more_body": True})
+
+        parts = []
+        try:
+            async for text in turn.answer(stream=True):
+                parts.append(text)
+                await emit("chunk", {"text": text})
+            bot_response = "".join(parts)
+            addons = await turn.finish(bot_response)
+            await emit("done", {
+                "addons": addons,
+                "images": [],
+                "session_id": session_id,
+                "trimmed": chatbot_app.trim_report(turn.plan),
+            })
+            bot_response, route = bot_response + addons, turn.route
+        except QueueFull:
+            await emit("error", {"response": BUSY_RESPONSE})
+            bot_response, route = BUSY_RESPONSE, "busy"
+        except Exception as e:
+            print(f"Error with Gemini API: {e}")
+            chatbot_app.CHAT_ERRORS.inc(endpoint="asgi_stream", kind=type(e).__name__)
+            await emit("error", {"response": chatbot_app.ERROR_RESPONSE})
+            bot_response, route = chatbot_app.ERROR_RESPONSE, "error"
+        await send({"type": "http.response.body", "body": b""})
+    chatbot_app.record_chat("asgi_stream", timer, route, turn.plan, bot_response, session_id, user_message)
+
+
+async def ask_gemini_async(knowledge, user_message):
+    """Async counterpart of app.ask_gemini, sharing the concurrency limiter with other chats."""
+    turn = AsyncTurn(knowledge, None, user_message, StageTimer(), "asgi_batch")
+    try:
+        bot_response = "".join([text async for text in turn.ask_model()])
+    except QueueFull:
+        return BUSY_RESPONSE, "busy"
+    except Exception as e:
+        print(f"Error with Gemini API: {e}")
+        return chatbot_app.ERROR_RESPONSE, "error"
+    if turn.plan is not None:
+        chatbot_app.record_trims("asgi_batch", turn.plan)
+    return bot_response, turn.route
+
+
+async def chat_batch_endpoint(scope, receive, send):
+    """Same as the Flask /api/chat/batch, with the Gemini calls awaited concurrently."""
+    timer = StageTimer()
+    payload = await read_payload(receive, send, "asgi_batch")
+    if payload is None:
+        return
+    messages, error = chatbot_app.parse_batch(payload)
+    if error:
+        await send_json(send, 400, {"error": error})
+        return
+    questions = chatbot_app.batch_questions(messages)
+    try:
+        slot = chatbot_app.admit_client("asgi_batch", scope_client(scope), None,
+                                        max(map(chatbot_app.message_length, messages)),
+                                        cost=max(1, len(questions)))
+    except Rejected as e:
+        await send_rejection(send, e)
+        return
+    with slot:
+        knowledge = chatbot_app.KNOWLEDGE.current
+
+        with timer.stage("route"):
+            answers = await run_state(chatbot_app.local_answers, knowledge, questions)
+        pending = [question for question in questions if question not in answers]
+        with timer.stage("upstream"):
+            replies = await asyncio.gather(*[ask_gemini_async(knowledge, question) for question in pending])
+            answers.update(zip(pending, replies))
+        with timer.stage("postprocess"):
+            results = await run_state(chatbot_app.batch_results, knowledge, messages, answers)
+        with timer.stage("serialize"):
+            await send_json(send, 200, {"results": results})
+    chatbot_app.record_batch("asgi_batch", timer, messages, results)
+
+
+CHAT_ROUTES = {
+    "/api/chat": chat_endpoint,
+    "/api/chat/stream": chat_stream_endpoint,
+    "/api/chat/batch": chat_batch_endpoint,
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # A long-running server can build the Gemini model while it starts taking requests
+            if not config.WARMUP_ON_START:
+                chatbot_app.warm_up_in_background()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+
+    handler = CHAT_ROUTES.get(scope.get("path"))
+    if scope["type"] == "http" and handler is not None and scope["method"] == "POST":
+        await handler(scope, receive, send)
+    elif flask_application is not None:
+        await flask_application(scope, receive, send)
+    else:
+        await send_json(send, 404, {"error": "Not found"})
@@ -0,0 +1,96 @@
+"""Micro-benchmark for the answer augmentation rules as the rule table grows.
+
+    python -m bench.augment_bench --rules 2,10,100,500,1000 --output augment_results.json
+
+Compares, per question in bench/questions.json, the original per-rule substring scans, one
+combined regex alternation and the compiled word trie used by chatbot.augment.Augmenter.
+"""
+import argparse
+import json
+import random
+import re
+import string
+import sys
+import time
+
+from bench.load_test import QUESTIONS_FILE, load_questions
+from chatbot.augment import AUGMENT_RULES, AugmentRule, Augmenter
+
+
+def synthetic_rules(count, seed=1):
+    """The real rules plus made-up ones, each with words, prefixes and two-word phrases."""
+    rng = random.Random(seed)
+
+    def word():
+        return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+
+    rules = list(AUGMENT_RULES[:count])
+    while len(rules) < count:
+        patterns = [word(), word() + "*", f"{word()} {word()}", word(), f"{word()} {word()}*", word()]
+        rules.append(AugmentRule(f"rule{len(rules)}", patterns, "faqs", "More:"))
+    return rules
+
+
+def substring_scan(rules):
+    # What app.py did before: lowercase the message and test every term of every rule
+    terms = [[pattern.rstrip("*") for pattern in rule.patterns] for rule in rules]
+
+    def match(message):
+        lowered = message.lower()
+        return [rule.name for rule, rule_terms in zip(rules, terms) if any(term in lowered for term in rule_terms)]
+    return match
+
+
+def regex_alternation(rules):
+    # One combined regex with an alternative per pattern; Python's re tries them one by one
+    alternatives = []
+    for rule in rules:
+        for pattern in rule.patterns:
+            body = r"\s+".join(re.escape(word) for word in pattern.rstrip("*").split())
+            alternatives.append(rf"\b{body}\w*" if pattern.endswith("*") else rf"\b{body}\b")
+    regex = re.compile("|".join(alternatives), re.IGNORECASE)
+    return lambda message: regex.findall(message)
+
+
+def word_trie(rules):
+    augmenter = Augmenter(rules)
+    return augmenter.matched_rules
+
+
+def time_per_message(match, messages, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            match(message)
+    return (time.perf_counter() - started) / (repeat * len(messages)) * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark augmentation rule matching.")
+    parser.add_argument('--rules', default='2,10,100,500,1000', help="comma-separated rule counts")
+    parser.add_argument('--repeat', type=int, default=200, help="passes over the question mix")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    messages, _ = load_questions(QUESTIONS_FILE)
+    strategies = (("substring", substring_scan), ("regex", regex_alternation), ("trie", word_trie))
+    results = []
+    print(f"{'rules':>6} {'patterns':>9} " + " ".join(f"{name + ' us':>13}" for name, _ in strategies))
+    for count in [int(count) for count in args.rules.split(',') if count.strip()]:
+        rules = synthetic_rules(count)
+        row = {"rules": count, "patterns": sum(len(rule.patterns) for rule in rules), "us_per_message": {}}
+        for name, build in strategies:
+            row["us_per_message"][name] = round(time_per_message(build(rules), messages, args.repeat), 2)
+        results.append(row)
+        print(f"{count:>6} {row['patterns']:>9} "
+              + " ".join(f"{row['us_per_message'][name]:>13}" for name, _ in strategies))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"messages": len(messages), "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,350 @@
+"""Offline load test for /api/chat against the stub Gemini backend (no API quota is used).
+
+    python -m bench.load_test --concurrency 1,8,32 --requests 300 --output bench_results.json
+    python -m bench.load_test --baseline bench_results.json   # exit 1 on a regression
+
+Each worker plays one visitor: it keeps its session cookie for --turns questions drawn from
+bench/questions.json (weighted), then starts a new session. For every concurrency level the
+report has req/s, latency percentiles, how the requests were answered, the prompt size Gemini
+would receive at each turn of a conversation, and the process RSS sampled during the run.
+
+Upstream limits (UPSTREAM_RATE, UPSTREAM_BURST, ...) apply as configured; pass --upstream-rate
+to lift the Gemini rate limit and measure the app itself.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+QUESTIONS_FILE = os.path.join(BENCH_DIR, 'questions.json')
+ROUTES = ("intent", "cache", "model", "coalesced", "fallback", "error")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test /api/chat with a stubbed Gemini backend.")
+    parser.add_argument('--concurrency', default='1,8,32',
+                        help="comma-separated concurrency levels (default: 1,8,32)")
+    parser.add_argument('--requests', type=int, default=200, help="requests per level (default: 200)")
+    parser.add_argument('--turns', type=int, default=6, help="questions per visitor session (default: 6)")
+    parser.add_argument('--latency', type=float, default=0.8, help="stub seconds to first token")
+    parser.add_argument('--tokens-per-second', type=float, default=50.0,
+                        help="stub generation rate, in words per second")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of stub calls that fail")
+    parser.add_argument('--upstream-rate', type=float, default=None,
+                        help="override UPSTREAM_RATE (and UPSTREAM_BURST) for the run")
+    parser.add_argument('--questions', default=QUESTIONS_FILE, help="weighted question mix (JSON)")
+    parser.add_argument('--memory-interval', type=float, default=0.5, help="RSS sampling interval")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--skip-cold-start', action='store_true', help="skip the cold-start profile")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="compare against a previous results file")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="allowed relative regression against the baseline (default: 0.2)")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args):
+    # Must run before `app` is imported: chatbot.config reads the environment at import time
+    os.environ['GEMINI_STUB'] = '1'
+    os.environ['GEMINI_STUB_LATENCY'] = str(args.latency)
+    os.environ['GEMINI_STUB_TOKENS_PER_SECOND'] = str(args.tokens_per_second)
+    os.environ['GEMINI_STUB_ERROR_RATE'] = str(args.error_rate)
+    os.environ['SLOW_REQUEST_SECONDS'] = '0'
+    # Every simulated visitor comes from the same address; per-client limits would throttle the run
+    os.environ.setdefault('ADMISSION_IP_RATE', '0')
+    os.environ.setdefault('ADMISSION_SESSION_RATE', '0')
+    if args.upstream_rate:
+        os.environ['UPSTREAM_RATE'] = str(args.upstream_rate)
+        os.environ['UPSTREAM_BURST'] = str(max(1, int(args.upstream_rate)))
+
+
+def load_questions(path):
+    with open(path, encoding='utf-8') as f:
+        items = json.load(f)
+    return [item['message'] for item in items], [item.get('weight', 1) for item in items]
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summarize_ms(seconds):
+    if not seconds:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    return {
+        "p50": round(percentile(seconds, 0.5) * 1000, 2),
+        "p95": round(percentile(seconds, 0.95) * 1000, 2),
+        "p99": round(percentile(seconds, 0.99) * 1000, 2),
+        "mean": round(sum(seconds) / len(seconds) * 1000, 2),
+        "max": round(max(seconds) * 1000, 2),
+    }
+
+
+def rss_bytes():
+    """Current resident set size, or the peak where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class MemorySampler(threading.Thread):
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._t0 = time.perf_counter()
+        self._done = threading.Event()
+
+    def sample(self):
+        self.samples.append({"t": round(time.perf_counter() - self._t0, 2), "rss_bytes": rss_bytes()})
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.sample()
+
+
+# Runs in a fresh interpreter, as a serverless cold start would, with the real (lazy) Gemini setup
+COLD_START_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+client.get('/')
+index = time.perf_counter()
+client.get('/api/campus_images')
+images = time.perf_counter()
+try:
+    model_seconds = app.warm_up()
+except Exception:
+    model_seconds = None
+print(json.dumps({"import": imported - started, "first_index": index - imported,
+                  "first_campus_images": images - index, "model_init": model_seconds}))
+"""
+
+
+def parse_importtime(stderr, limit=10):
+    """Slowest top-level imports (and their direct children) in the cold-start process, from
+    -X importtime: app itself, then whatever warm_up() pulled in for the Gemini SDK."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        if depth <= 1 and cumulative.strip().isdigit():
+            modules.append({"module": name.strip(), "cumulative_ms": round(int(cumulative) / 1000, 1)})
+    modules.sort(key=lambda module: module["cumulative_ms"], reverse=True)
+    return modules[:limit]
+
+
+def profile_cold_start():
+    """Time importing app, the first non-chat requests and the Gemini model setup in a new process."""
+    env = dict(os.environ, GEMINI_STUB='0', WARMUP_ON_START='0')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', COLD_START_SCRIPT],
+                            cwd=os.path.dirname(BENCH_DIR), env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1:] or ["cold start failed"]}
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    profile = {name + "_ms": round(seconds * 1000, 1) if seconds is not None else None
+               for name, seconds in timings.items()}
+    profile["top_imports"] = parse_importtime(result.stderr)
+    return profile
+
+
+def prompt_sizes_by_turn(prompts, setup_messages):
+    """Group the stub's (history messages, prompt bytes) records by conversation turn."""
+    turns = {}
+    for history_messages, size in prompts:
+        turn = (history_messages - setup_messages) // 2 + 1
+        turns.setdefault(turn, []).append(size)
+    return [{"turn": turn, "calls": len(sizes), "mean_bytes": round(sum(sizes) / len(sizes)),
+             "max_bytes": max(sizes)} for turn, sizes in sorted(turns.items())]
+
+
+def run_level(chatbot_app, concurrency, args, questions, weights):
+    # Start every level from a cold cache and an empty prompt log so levels are comparable
+    chatbot_app.RESPONSE_CACHE.clear()
+    model, use_system_instruction = chatbot_app.MODEL.get()
+    model.prompts.clear()
+    routes_before = {route: chatbot_app.CHAT_REQUESTS.value(endpoint="chat", route=route) for route in ROUTES}
+    calls_before = model.calls
+
+    lock = threading.Lock()
+    remaining = [args.requests]
+    latencies = []
+    failures = [0]
+
+    def worker(index):
+        rng = random.Random(args.seed * 1000 + index)
+        client, turn = chatbot_app.app.test_client(), 0
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            if turn == args.turns:
+                # A fresh client has no session cookie, so the next question starts a new visitor
+                client, turn = chatbot_app.app.test_client(), 0
+            message = rng.choices(questions, weights)[0]
+            started = time.perf_counter()
+            response = client.post('/api/chat', json={"message": message})
+            elapsed = time.perf_counter() - started
+            turn += 1
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code != 200:
+                    failures[0] += 1
+
+    sampler = MemorySampler(args.memory_interval)
+    sampler.sample()
+    sampler.start()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+    sampler.stop()
+
+    setup_messages = 0 if use_system_instruction else len(chatbot_app.KNOWLEDGE.current.setup_history)
+    prompts = list(model.prompts)
+    sizes = [size for _, size in prompts]
+    rss = [sample["rss_bytes"] for sample in sampler.samples if sample["rss_bytes"] is not None]
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "failures": failures[0],
+        "duration_seconds": round(duration, 3),
+        "requests_per_second": round(len(latencies) / duration, 2) if duration else None,
+        "latency_ms": summarize_ms(latencies),
+        "routes": {route: chatbot_app.CHAT_REQUESTS.value(endpoint="chat", route=route) - routes_before[route]
+                   for route in ROUTES},
+        "upstream_calls": model.calls - calls_before,
+        "prompt_bytes": {
+            "p50": percentile(sizes, 0.5),
+            "p95": percentile(sizes, 0.95),
+            "max": max(sizes) if sizes else None,
+            "by_turn": prompt_sizes_by_turn(prompts, setup_messages),
+        },
+        "memory": {
+            "start_bytes": rss[0] if rss else None,
+            "end_bytes": rss[-1] if rss else None,
+            "peak_bytes": max(rss) if rss else None,
+            "samples": sampler.samples,
+        },
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions against a previous run, matched by concurrency level."""
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    problems = []
+    new_import = results.get("cold_start", {}).get("import_ms")
+    old_import = baseline.get("cold_start", {}).get("import_ms")
+    if new_import and old_import and (new_import - old_import) / old_import > tolerance:
+        problems.append(f"cold start: import {old_import} ms -> {new_import} ms")
+    for level in results["levels"]:
+        old = previous.get(level["concurrency"])
+        if old is None:
+            continue
+        checks = (
+            ("p95 latency (ms)", level["latency_ms"]["p95"], old["latency_ms"]["p95"], True),
+            ("req/s", level["requests_per_second"], old["requests_per_second"], False),
+            ("max prompt bytes", level["prompt_bytes"]["max"], old["prompt_bytes"]["max"], True),
+            ("peak RSS bytes", level["memory"]["peak_bytes"], old["memory"]["peak_bytes"], True),
+        )
+        for name, new, before, lower_is_better in checks:
+            if not new or not before:
+                continue
+            change = (new - before) / before
+            if (change if lower_is_better else -change) > tolerance:
+                problems.append(f"concurrency {level['concurrency']}: {name} {before} -> {new} ({change:+.0%})")
+    return problems
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_environment(args)
+    import app as chatbot_app
+
+    questions, weights = load_questions(args.questions)
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+    results = {
+        "config": {
+            "requests": args.requests,
+            "turns": args.turns,
+            "latency": args.latency,
+            "tokens_per_second": args.tokens_per_second,
+            "error_rate": args.error_rate,
+            "upstream_rate": chatbot_app.UPSTREAM.limiter.rate,
+            "questions": len(questions),
+            "knowledge_version": chatbot_app.KNOWLEDGE.current.version,
+            "python": platform.python_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "levels": [],
+    }
+
+    if not args.skip_cold_start:
+        cold_start = results["cold_start"] = profile_cold_start()
+        if "error" in cold_start:
+            print(f"Cold start profile failed: {cold_start['error']}")
+        else:
+            print(f"Cold start: import {cold_start['import_ms']} ms, first / {cold_start['first_index_ms']} ms, "
+                  f"first campus images {cold_start['first_campus_images_ms']} ms, "
+                  f"Gemini model init {cold_start['model_init_ms']} ms")
+            for module in cold_start["top_imports"][:5]:
+                print(f"  {module['cumulative_ms']:>8} ms  {module['module']}")
+
+    print(f"{'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'fail':>5} "
+          f"{'prompt max':>11} {'peak MB':>8}")
+    for concurrency in levels:
+        level = run_level(chatbot_app, concurrency, args, questions, weights)
+        results["levels"].append(level)
+        latency, peak = level["latency_ms"], level["memory"]["peak_bytes"]
+        print(f"{concurrency:>5} {level['requests_per_second']:>8} {latency['p50']:>8} {latency['p95']:>8} "
+              f"{latency['p99']:>8} {level['failures']:>5} {level['prompt_bytes']['max'] or 0:>11} "
+              f"{(peak or 0) / 1e6:>8.1f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""Regression check for INFO section retrieval over bench/questions.json.
+
+    python -m bench.retrieval_check             # exit 1 when a question misses a section
+
+A question's "sections" lists what Gemini must see to answer it, as INFO keys or "parent/prefix"
+for nested entries (as in chatbot.intents); "all" means no section answers it, so the full
+knowledge base must be sent. Falling back to the full knowledge base satisfies any list.
+"""
+import argparse
+import json
+import sys
+
+from bench.load_test import QUESTIONS_FILE
+from chatbot import config
+from chatbot.context import compile_context
+from chatbot.knowledge import load_info
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Check which INFO sections each question retrieves.")
+    parser.add_argument('--questions', default=QUESTIONS_FILE, help="questions with expected sections (JSON)")
+    parser.add_argument('--info', default=config.INFO_PATH, help="knowledge base file")
+    return parser.parse_args(argv)
+
+
+def section_wanted(section, wanted):
+    parent, _, prefix = wanted.rpartition("/")
+    if parent:
+        return section.parent == parent and section.key.startswith(prefix)
+    return section.parent is None and section.key == prefix
+
+
+def check(knowledge, message, expected):
+    """(selected section keys or None for the full knowledge base, list of problems)."""
+    sections = knowledge.select_sections(message)
+    if sections is None:
+        return None, []
+    if expected == "all":
+        return [section.key for section in sections], ["expected the full knowledge base"]
+    missing = [wanted for wanted in expected if not any(section_wanted(s, wanted) for s in sections)]
+    return [section.key for section in sections], [f"missing {wanted}" for wanted in missing]
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    info, _ = load_info(args.info)
+    knowledge = compile_context(info, "")
+    with open(args.questions, encoding='utf-8') as f:
+        items = json.load(f)
+
+    failures = 0
+    for item in items:
+        if "sections" not in item:
+            continue
+        selected, problems = check(knowledge, item["message"], item["sections"])
+        failures += bool(problems)
+        shown = "full knowledge base" if selected is None else ", ".join(selected)
+        print(f"{'FAIL' if problems else 'ok':>4}  {item['message']}\n      {shown}")
+        for problem in problems:
+            print(f"      {problem}")
+    print(f"{failures} of {sum('sections' in item for item in items)} questions failed")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
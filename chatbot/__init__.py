@@ -0,0 +1 @@
+# Support modules for the OLFU Antipolo SHS chatbot (see app.py for the routes)
@@ -0,0 +1,173 @@
+import math
+import threading
+import time
+
+
+class Rejected(Exception):
+    """A request refused before any work was done for it.
+
+    `status` is the HTTP status to answer with and `retry_after` the seconds the client should
+    wait before trying again (None when retrying the same request won't help).
+    """
+
+    def __init__(self, reason, status=429, retry_after=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self):
+        return str(max(1, math.ceil(self.retry_after))) if self.retry_after is not None else None
+
+
+def client_address(remote_addr, forwarded_for=None, trusted_hops=0):
+    """The client's IP. Behind `trusted_hops` proxies that append to X-Forwarded-For, it is
+    that many entries from the right; anything further left may be forged by the client."""
+    if trusted_hops and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        if hops:
+            return hops[-min(trusted_hops, len(hops))]
+    return remote_addr or "unknown"
+
+
+class KeyedBuckets:
+    """Token buckets per client key: `rate` tokens a second, holding at most `burst`.
+
+    Each bucket is a [tokens, updated] pair in one dict. A request costing more than `burst`
+    is let through once the bucket is full and leaves it in debt, so it is paid for in full
+    without being impossible. sweep() drops buckets that have refilled completely, since a
+    full bucket is what a new client gets anyway; beyond `max_keys` the oldest buckets are
+    dropped as well. Not thread-safe on its own.
+    """
+
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def take(self, key, now, cost=1):
+        """0.0 if `cost` tokens were taken, else the seconds until they will be there."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._evict(now)
+            bucket = self._buckets[key] = [float(self.burst), now]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        needed = min(cost, self.burst)
+        if tokens >= needed:
+            bucket[0] = tokens - cost
+            return 0.0
+        bucket[0] = tokens
+        return (needed - tokens) / self.rate
+
+    def refund(self, key, cost=1):
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket[0] = min(self.burst, bucket[0] + cost)
+
+    def sweep(self, now):
+        full = [key for key, (tokens, updated) in self._buckets.items()
+                if tokens + (now - updated) * self.rate >= self.burst]
+        for key in full:
+            del self._buckets[key]
+        return len(full)
+
+    def _evict(self, now):
+        if self.sweep(now) or not self._buckets:
+            return
+        # Every client is still limited: drop the oldest tenth (dicts keep insertion order)
+        for key in list(self._buckets)[:max(1, self.max_keys // 10)]:
+            del self._buckets[key]
+
+
+class _Slot:
+    """A request's place under the concurrency ceiling; release() (or leaving the with block)
+    gives it back, and only the first call counts."""
+
+    __slots__ = ('_controller', '_released')
+
+    def __init__(self, controller):
+        self._controller = controller
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class AdmissionController:
+    """Decides whether a chat request may proceed, before any prompt is built for it.
+
+    admit() raises Rejected for, in order: a message longer than `max_message_chars` (413), a
+    request beyond `max_concurrent` already in flight (429), or a client over its per-IP or
+    per-session token bucket (429 with the wait until its next token). A rate or limit of 0
+    turns that check off. `cost` is the tokens a request takes from the buckets (a batch pays
+    per question). Buckets that have refilled are swept every `sweep_interval` seconds,
+    so idle clients cost nothing and the tables stay small at high request rates.
+    """
+
+    def __init__(self, ip_rate=2.0, ip_burst=30, session_rate=0.5, session_burst=10, max_message_chars=2000,
+                 max_concurrent=256, max_clients=100000, sweep_interval=30.0, clock=time.monotonic):
+        self.max_message_chars = max_message_chars
+        self.max_concurrent = max_concurrent
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.ip_buckets = KeyedBuckets(ip_rate, ip_burst, max_clients) if ip_rate else None
+        self.session_buckets = KeyedBuckets(session_rate, session_burst, max_clients) if session_rate else None
+        self._swept = clock()
+        self.in_flight = 0
+
+    def admit(self, client, session_id=None, message_chars=0, cost=1):
+        """A _Slot to release when the request is done, or Rejected."""
+        with self._lock:
+            if self.max_message_chars and message_chars > self.max_message_chars:
+                raise Rejected("message_too_long", status=413)
+            now = self._clock()
+            if now - self._swept >= self.sweep_interval:
+                self._sweep(now)
+            if self.max_concurrent and self.in_flight >= self.max_concurrent:
+                raise Rejected("overloaded", retry_after=1)
+            if self.ip_buckets is not None:
+                wait = self.ip_buckets.take(client, now, cost)
+                if wait:
+                    raise Rejected("ip_rate_limited", retry_after=wait)
+            if self.session_buckets is not None and session_id:
+                wait = self.session_buckets.take(session_id, now, cost)
+                if wait:
+                    if self.ip_buckets is not None:
+                        self.ip_buckets.refund(client, cost)
+                    raise Rejected("session_rate_limited", retry_after=wait)
+            self.in_flight += 1
+        return _Slot(self)
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _sweep(self, now):
+        self._swept = now
+        for buckets in (self.ip_buckets, self.session_buckets):
+            if buckets is not None:
+                buckets.sweep(now)
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "ip_clients": len(self.ip_buckets) if self.ip_buckets is not None else 0,
+            "session_clients": len(self.session_buckets) if self.session_buckets is not None else 0,
+        }
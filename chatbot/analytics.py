@@ -0,0 +1,165 @@
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+LOG_NAME = "conversations"
+
+_STOP = object()
+
+
+class ConversationLog:
+    """Analytics log of chat turns that never blocks the request handling them.
+
+    record() puts a small dict on a bounded queue; when `max_queue` records are waiting, new
+    ones are dropped (and counted) rather than waited for. A background thread writes them in
+    batches of up to `batch_size`, at least every `flush_interval` seconds, as JSON lines to
+    <directory>/conversations.jsonl. After `max_file_bytes` that file is renamed to
+    conversations-<UTC time>.jsonl and only the newest `keep_files` renamed files are kept.
+    `enrich(record)` runs on the writer thread, for work that shouldn't slow the request down.
+    """
+
+    def __init__(self, directory, max_queue=10000, batch_size=256, flush_interval=2.0,
+                 max_file_bytes=50 * 1024 * 1024, keep_files=20, enrich=None):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{LOG_NAME}.jsonl")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_file_bytes = max_file_bytes
+        self.keep_files = keep_files
+        self.enrich = enrich
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._failing = False
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.rotations = 0
+
+    def record(self, **fields):
+        """Queue one record for writing; returns False if it was dropped."""
+        if self._thread is None:
+            self._start()
+        fields.setdefault("ts", round(time.time(), 3))
+        try:
+            self._queue.put_nowait(fields)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="analytics-writer", daemon=True)
+                self._thread.start()
+
+    def close(self, timeout=5.0):
+        """Write what is queued and stop the writer thread."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+
+    def _write(self, batch):
+        lines = []
+        for record in batch:
+            try:
+                if self.enrich is not None:
+                    record = self.enrich(record)
+                lines.append(json.dumps(record, separators=(",", ":"), ensure_ascii=False))
+            except Exception as e:
+                self._count_error(f"Skipping analytics record: {e}")
+        if not lines:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+                size = f.tell()
+            self.written += len(lines)
+            self._failing = False
+            if size >= self.max_file_bytes:
+                self._rotate()
+        except OSError as e:
+            with self._lock:
+                self.dropped += len(lines)
+            # Report the first failure of a run, not every batch while the disk stays unusable
+            self._count_error(None if self._failing else f"Analytics log unavailable, dropping records: {e}")
+            self._failing = True
+
+    def _count_error(self, message):
+        with self._lock:
+            self.errors += 1
+        if message:
+            print(message)
+
+    def _rotate(self):
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        os.replace(self.path, os.path.join(self.directory, f"{LOG_NAME}-{stamp}.jsonl"))
+        self.rotations += 1
+        rotated = log_files(self.directory, active=False)
+        for old in rotated[:max(0, len(rotated) - self.keep_files)]:
+            os.remove(old)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "rotations": self.rotations,
+        }
+
+
+def log_files(directory, active=True):
+    """Log files in the directory, oldest first (the file being written last)."""
+    files = sorted(glob.glob(os.path.join(glob.escape(directory), f"{LOG_NAME}-*.jsonl")))
+    path = os.path.join(directory, f"{LOG_NAME}.jsonl")
+    if active and os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def read_records(paths):
+    """Records from JSONL log files; unreadable lines (a torn last write) are skipped."""
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict):
+                    yield record
@@ -0,0 +1,156 @@
+"""Summarize the conversation analytics log (see chatbot/analytics.py).
+
+    python -m chatbot.analytics_report                   # logs/ (ANALYTICS_DIR)
+    python -m chatbot.analytics_report logs/ --since 24 --top 30
+    python -m chatbot.analytics_report logs/conversations.jsonl --json > report.json
+
+Reports the most asked questions with how they were answered (the candidates for intents and
+cache warming), the route and intent mix, latency percentiles per endpoint and route, and
+prompt and response sizes.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from chatbot import config
+from chatbot.analytics import log_files, read_records
+
+PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of sorted values."""
+    return values[min(len(values) - 1, int(q * len(values)))] if values else None
+
+
+def latency_summary(latencies):
+    latencies = sorted(latencies)
+    summary = {"count": len(latencies)}
+    for q in PERCENTILES:
+        summary[f"p{round(q * 100)}"] = percentile(latencies, q)
+    summary["max"] = latencies[-1] if latencies else None
+    return summary
+
+
+def summarize(records, top=20):
+    routes, intents, endpoints = Counter(), Counter(), Counter()
+    questions, question_routes = Counter(), {}
+    latencies = {}
+    prompt_tokens, response_bytes = [], []
+    sessions = set()
+    total = withheld = trimmed = 0
+    first = last = None
+    for record in records:
+        total += 1
+        ts = record.get("ts")
+        if isinstance(ts, (int, float)):
+            first = ts if first is None else min(first, ts)
+            last = ts if last is None else max(last, ts)
+        route, endpoint = record.get("route"), record.get("endpoint")
+        routes[route] += 1
+        endpoints[endpoint] += 1
+        intents[record.get("intent")] += 1
+        if record.get("session"):
+            sessions.add(record["session"])
+        question = record.get("question")
+        if question:
+            questions[question] += 1
+            question_routes.setdefault(question, Counter())[route] += 1
+        elif question is None:
+            withheld += 1
+        if isinstance(record.get("latency_ms"), (int, float)):
+            latencies.setdefault((endpoint, route), []).append(record["latency_ms"])
+            latencies.setdefault(("all", "all"), []).append(record["latency_ms"])
+        if record.get("prompt_tokens"):
+            prompt_tokens.append(record["prompt_tokens"])
+        if isinstance(record.get("response_bytes"), int):
+            response_bytes.append(record["response_bytes"])
+        trimmed += bool(record.get("trimmed"))
+
+    local = routes["intent"] + routes["cache"] + routes["coalesced"]
+    return {
+        "records": total,
+        "sessions": len(sessions),
+        "from": first,
+        "to": last,
+        "routes": dict(routes.most_common()),
+        "answered_without_own_gemini_call": round(local / total, 4) if total else None,
+        "endpoints": dict(endpoints.most_common()),
+        "intents": {str(name): count for name, count in intents.most_common()},
+        "top_questions": [
+            {"question": question, "count": count, "routes": dict(question_routes[question].most_common())}
+            for question, count in questions.most_common(top)
+        ],
+        "distinct_questions": len(questions),
+        "withheld_questions": withheld,
+        "latency_ms": {f"{endpoint}/{route}": latency_summary(values)
+                       for (endpoint, route), values in sorted(latencies.items(), key=lambda item: str(item[0]))},
+        "prompt_tokens": latency_summary(prompt_tokens),
+        "response_bytes": latency_summary(response_bytes),
+        "trimmed_prompts": trimmed,
+    }
+
+
+def format_time(ts):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)) if ts is not None else "-"
+
+
+def print_report(report):
+    print(f"{report['records']} turns, {report['sessions']} sessions, "
+          f"{format_time(report['from'])} to {format_time(report['to'])}")
+    if not report["records"]:
+        return
+    print(f"Answered without a Gemini call of their own: {report['answered_without_own_gemini_call']:.1%}")
+    print("\nRoutes:   " + ", ".join(f"{route}={count}" for route, count in report["routes"].items()))
+    print("Intents:  " + ", ".join(f"{intent}={count}" for intent, count in report["intents"].items()))
+
+    print(f"\nTop questions ({report['distinct_questions']} distinct, "
+          f"{report['withheld_questions']} withheld as possibly personal):")
+    for item in report["top_questions"]:
+        routes = " ".join(f"{route}={count}" for route, count in item["routes"].items())
+        print(f"  {item['count']:>6}  {item['question'][:70]:<70}  {routes}")
+
+    columns = ("p50", "p90", "p95", "p99", "max")
+    print(f"\n{'latency ms':<28}{'count':>8}" + "".join(f"{name:>10}" for name in columns))
+    for name, summary in report["latency_ms"].items():
+        print(f"{name:<28}{summary['count']:>8}" + "".join(f"{summary[key]:>10}" for key in columns))
+
+    for label, key in (("Prompt tokens", "prompt_tokens"), ("Response bytes", "response_bytes")):
+        summary = report[key]
+        if summary["count"]:
+            print(f"\n{label}: p50 {summary['p50']}, p95 {summary['p95']}, max {summary['max']}")
+    print(f"Prompts trimmed to the token budget: {report['trimmed_prompts']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize the conversation analytics log.")
+    parser.add_argument('paths', nargs='*', help="log directories or files (default: ANALYTICS_DIR)")
+    parser.add_argument('--since', type=float, help="only turns from the last N hours")
+    parser.add_argument('--top', type=int, default=20, help="number of top questions to list")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    files = []
+    for path in args.paths or [config.ANALYTICS_DIR]:
+        files.extend(log_files(path) if os.path.isdir(path) else [path])
+    if not files:
+        print("No conversation logs found.", file=sys.stderr)
+        return 1
+    records = read_records(files)
+    if args.since is not None:
+        cutoff = time.time() - args.since * 3600
+        records = (record for record in records if record.get("ts", 0) >= cutoff)
+
+    report = summarize(records, top=args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
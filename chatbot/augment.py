@@ -0,0 +1,43 @@
+import threading
+from collections import namedtuple
+
+from chatbot.keywords import KeywordMatcher
+
+# When the question mentions one of `patterns`, the INFO `section` is appended to the answer
+# under `heading` (unless the answer already contains it). Patterns use KeywordMatcher syntax.
+AugmentRule = namedtuple('AugmentRule', ['name', 'patterns', 'section', 'heading'])
+
+AUGMENT_RULES = [
+    AugmentRule("location",
+                ["location*", "address*", "where", "map*", "direction*", "how to get there"],
+                "location_details", "Here's our exact location information:"),
+    AugmentRule("facilities",
+                ["campus*", "building*", "facilit*", "look like", "picture*", "photo*", "image*"],
+                "facilities", "Here's information about our campus facilities:"),
+]
+
+
+class Augmenter:
+    """Appends canonical INFO text to answers, matching every rule in one pass over the question."""
+
+    def __init__(self, rules=AUGMENT_RULES):
+        self.rules = {rule.name: rule for rule in rules}
+        self.matcher = KeywordMatcher((rule.name, rule.patterns) for rule in rules)
+        self._lock = threading.Lock()
+        self.hits = dict.fromkeys(self.rules, 0)
+
+    def matched_rules(self, user_message):
+        """Rules triggered by the message, in rule table order."""
+        names = self.matcher.scores(user_message)
+        return [rule for name, rule in self.rules.items() if name in names]
+
+    def addons(self, info, user_message, bot_response=""):
+        addons = ""
+        for rule in self.matched_rules(user_message):
+            text = info.get(rule.section)
+            if not isinstance(text, str) or not text or text in bot_response:
+                continue
+            with self._lock:
+                self.hits[rule.name] += 1
+            addons += f"\n\n{rule.heading}\n{text}"
+        return addons
@@ -0,0 +1,119 @@
+from collections import namedtuple
+
+from chatbot.context import SETUP_ACK, estimate_tokens, format_prompt, format_prompt_prefix, format_sections
+from chatbot.intents import is_open_ended
+
+# What one Gemini turn will send: the prompt, the history to replay, the output cap, the
+# estimated input size and what was left out to fit ({} when nothing was)
+PromptPlan = namedtuple('PromptPlan', ['prompt', 'history', 'max_output_tokens', 'input_tokens', 'trimmed'])
+
+
+def _pairs(history):
+    return [history[i:i + 2] for i in range(0, len(history) - 1, 2)]
+
+
+def _entries_tokens(entries):
+    return sum(estimate_tokens(part) for entry in entries for part in entry["parts"])
+
+
+def minimum_input_tokens(system_prompt, max_message_chars):
+    """Smallest input budget that still fits the system prompt and a question of max_message_chars
+    with no history or sections; anything less would cut questions to nothing."""
+    return (estimate_tokens(system_prompt) + estimate_tokens(SETUP_ACK)
+            + estimate_tokens(format_prompt(format_prompt_prefix(format_sections([])), "x" * max_message_chars)))
+
+
+class TokenBudget:
+    """Keeps every Gemini request within an input token budget and sets its output budget.
+
+    The input is the system prompt, the replayed history, the knowledge sections and the
+    question. Over budget, the oldest history turns go first (the latest one is kept), then the
+    least relevant sections except the most relevant one, then the last history turn, then that
+    section. Dropped sections that fit in the room the history left are put back, most
+    relevant first; the question is cut only as a last resort. Factual questions get a smaller
+    output budget than open-ended ones.
+    """
+
+    def __init__(self, max_input_tokens=8000, factual_output_tokens=512, open_output_tokens=1024,
+                 factual_confidence=0.5):
+        self.max_input_tokens = max_input_tokens
+        self.factual_output_tokens = factual_output_tokens
+        self.open_output_tokens = open_output_tokens
+        self.factual_confidence = factual_confidence
+
+    def output_tokens(self, knowledge, user_message):
+        match = knowledge.router.classify(user_message)
+        factual = match is not None and match.confidence >= self.factual_confidence
+        if factual and not is_open_ended(user_message):
+            return self.factual_output_tokens
+        return self.open_output_tokens
+
+    def plan(self, knowledge, user_message, history=()):
+        """PromptPlan for this turn; `history` is the session's past turns in Gemini format."""
+        selected = knowledge.select_sections(user_message)
+        full_context = selected is None
+        sections = list(knowledge.sections if full_context else selected)
+        trimmed = {}
+
+        # Tokens of everything except the sections and history, which are trimmed separately
+        fixed = (estimate_tokens(knowledge.system_prompt) + estimate_tokens(SETUP_ACK)
+                 + estimate_tokens(format_prompt(format_prompt_prefix(format_sections([])), user_message)))
+        pairs = _pairs(list(history))
+        pair_tokens = [_entries_tokens(pair) for pair in pairs]
+        empty = estimate_tokens(format_sections([]))
+        section_tokens = {section: estimate_tokens(format_sections([section])) - empty for section in sections}
+        total = fixed + sum(pair_tokens) + sum(section_tokens.values())
+
+        def drop_pair():
+            nonlocal total
+            pairs.pop(0)
+            total -= pair_tokens.pop(0)
+            trimmed["history_turns"] = trimmed.get("history_turns", 0) + 1
+
+        removed = []
+
+        def drop_sections(candidates):
+            nonlocal total
+            for section in candidates:
+                if total <= self.max_input_tokens:
+                    break
+                removed.append(section)
+                total -= section_tokens[section]
+
+        while total > self.max_input_tokens and len(pairs) > 1:
+            drop_pair()
+        if total > self.max_input_tokens:
+            ids = {section: doc_id for doc_id, section in enumerate(knowledge.sections)}
+            scores = knowledge.index.scores(user_message)
+            # Least relevant first; ties drop later INFO entries before earlier ones
+            by_priority = sorted(sections, key=lambda section: (scores.get(ids[section], 0.0), -ids[section]))
+            drop_sections(by_priority[:-1])
+            while total > self.max_input_tokens and pairs:
+                drop_pair()
+            drop_sections(by_priority[-1:])
+            # Put back the sections that fit in the room the history left, most relevant first
+            for section in reversed(list(removed)):
+                if total + section_tokens[section] <= self.max_input_tokens:
+                    removed.remove(section)
+                    total += section_tokens[section]
+        if removed:
+            sections = [section for section in sections if section not in removed]
+            trimmed["sections"] = [section.key for section in removed]
+        if total > self.max_input_tokens:
+            # Only the question is left to cut: keep as much of its start as fits
+            keep_chars = max(0, len(user_message) - (total - self.max_input_tokens) * 4)
+            trimmed["message_chars"] = len(user_message) - keep_chars
+            total -= estimate_tokens(user_message) - estimate_tokens(user_message[:keep_chars])
+            user_message = user_message[:keep_chars]
+
+        if full_context and "sections" not in trimmed:
+            prompt = format_prompt(knowledge.prompt_prefix, user_message)
+        else:
+            prompt = format_prompt(format_prompt_prefix(format_sections(sections)), user_message)
+        return PromptPlan(
+            prompt=prompt,
+            history=[entry for pair in pairs for entry in pair],
+            max_output_tokens=self.output_tokens(knowledge, user_message),
+            input_tokens=total,
+            trimmed=trimmed,
+        )
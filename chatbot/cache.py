@@ -0,0 +1,209 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from chatbot.state import StateError
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Filler words dropped from cache keys; question words are kept since they change the answer
+CACHE_STOPWORDS = frozenset("""
+a an the is are am was were be been do does did can could would should will shall may might
+i me my we our you your it its this that these those there please pls po kindly just
+to of for in on at about and or so hi hello hey thanks thank ok okay
+""".split())
+
+# Backend key prefix for answers shared between workers
+CACHE_PREFIX = "cache:"
+
+# Words that reverse a question ("with"/"without form 138"); fuzzy matches must agree on them
+_NEGATIONS = frozenset("no not non without never cannot cant dont doesnt isnt arent wont t except".split())
+
+# Messages with personal details get personal answers, so they are never cached
+_PERSONAL_RE = re.compile(r"@|\bmy (name|number|phone|mobile|cell|email)\b|\bcall me\b|\bi am\b|\bi'm\b",
+                          re.IGNORECASE)
+
+# Runs of digits that may be a phone number written with separators ("+63 917 123 4567")
+_PHONE_RE = re.compile(r"\+?\(?\d[\d\s().-]{5,}\d")
+_YEAR_RANGE_RE = re.compile(r"(19|20)\d\d\s*-\s*(19|20)\d\d")
+
+
+def normalize_message(text):
+    """Cache key form of a message: lowercase words without punctuation or filler words."""
+    return " ".join(word for word in _WORD_RE.findall(text.lower()) if word not in CACHE_STOPWORDS)
+
+
+def _is_phone_number(text):
+    return sum(char.isdigit() for char in text) >= 7 and not _YEAR_RANGE_RE.fullmatch(text)
+
+
+def is_cacheable(text):
+    if _PERSONAL_RE.search(text):
+        return False
+    return not any(_is_phone_number(match.group()) for match in _PHONE_RE.finditer(text))
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _key_terms(normalized):
+    """Numbers and negations of a normalized message: near-identical questions that differ in
+    these ("grade 11" / "grade 12") ask something else, so fuzzy matches must have the same."""
+    return frozenset(word for word in normalized.split()
+                     if word in _NEGATIONS or any(char.isdigit() for char in word))
+
+
+class _Entry:
+    __slots__ = ('response', 'expires', 'trigrams', 'key_terms')
+
+    def __init__(self, response, expires, trigrams, key_terms):
+        self.response = response
+        self.expires = expires
+        self.trigrams = trigrams
+        self.key_terms = key_terms
+
+
+class ResponseCache:
+    """LRU + TTL cache of Gemini answers keyed on the normalized message and the INFO version.
+
+    Exact lookups are a dict hit. With a `shared` StateBackend, answers are also written there
+    and a local exact miss is looked up in it, so one worker's Gemini answer serves every
+    worker. When fuzzy_threshold is set, a remaining miss falls back to the locally cached
+    question with the highest character-trigram Jaccard similarity above the threshold that
+    has the same numbers and negations.
+    """
+
+    def __init__(self, max_entries=1000, ttl=3600, fuzzy_threshold=0.0, clock=time.monotonic,
+                 shared=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fuzzy_threshold = fuzzy_threshold
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._postings = {}
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, message, version):
+        """Cached answer for the message under this INFO version, or None."""
+        if not is_cacheable(message):
+            return None
+        normalized = normalize_message(message)
+        if not normalized:
+            return None
+        key = (version, normalized)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.response
+            if entry is not None:
+                self._remove(key)
+        if self.shared is not None:
+            response = self._shared_get(key)
+            if response is not None:
+                # Keep a local copy so the next lookup for it is a dict hit
+                self._store(key, response)
+                with self._lock:
+                    self.shared_hits += 1
+                return response
+        with self._lock:
+            if self.fuzzy_threshold:
+                key = self._fuzzy_match(version, normalized, now)
+                if key is not None:
+                    self._entries.move_to_end(key)
+                    self.fuzzy_hits += 1
+                    return self._entries[key].response
+            self.misses += 1
+            return None
+
+    def put(self, message, version, response):
+        if not is_cacheable(message):
+            return
+        normalized = normalize_message(message)
+        if not normalized:
+            return
+        key = (version, normalized)
+        self._store(key, response)
+        if self.shared is not None:
+            try:
+                self.shared.set(self._shared_key(key), response, ttl=self.ttl)
+            except StateError as e:
+                print(f"Shared response cache unavailable: {e}")
+
+    def _store(self, key, response):
+        trigrams = _trigrams(key[1])
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(response, self._clock() + self.ttl, trigrams, _key_terms(key[1]))
+            for trigram in trigrams:
+                self._postings.setdefault(trigram, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        """Drop the local entries; shared ones are keyed by version and simply expire."""
+        with self._lock:
+            self._entries.clear()
+            self._postings.clear()
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    @staticmethod
+    def _shared_key(key):
+        return f"{CACHE_PREFIX}{key[0]}:{key[1]}"
+
+    def _shared_get(self, key):
+        try:
+            return self.shared.get(self._shared_key(key))
+        except StateError as e:
+            print(f"Shared response cache unavailable: {e}")
+            return None
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for trigram in entry.trigrams:
+            keys = self._postings.get(trigram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[trigram]
+
+    def _fuzzy_match(self, version, normalized, now):
+        trigrams = _trigrams(normalized)
+        key_terms = _key_terms(normalized)
+        overlaps = {}
+        for trigram in trigrams:
+            for key in self._postings.get(trigram, ()):
+                if key[0] == version:
+                    overlaps[key] = overlaps.get(key, 0) + 1
+        best_key, best_score = None, self.fuzzy_threshold
+        for key, overlap in overlaps.items():
+            entry = self._entries[key]
+            score = overlap / (len(trigrams) + len(entry.trigrams) - overlap)
+            if score >= best_score and entry.expires > now and entry.key_terms == key_terms:
+                best_key, best_score = key, score
+        return best_key
@@ -0,0 +1,216 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+
+from chatbot.upstream import UpstreamTimeout, UpstreamUnavailable
+
+
+class CoalesceTimeout(UpstreamTimeout):
+    """The shared call made no progress for wait_timeout seconds."""
+
+
+class CoalesceAborted(UpstreamUnavailable):
+    """The request making the shared call went away before it finished."""
+
+
+class Flight:
+    """One upstream call whose answer, as it arrives, is shared by every request waiting on it.
+
+    Thread and asyncio waiters can both follow it: parts are appended under a Condition, and
+    waiting event loops are woken with call_soon_threadsafe.
+    """
+
+    def __init__(self, key, clock=time.monotonic):
+        self.key = key
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._loops = []
+        self.parts = []
+        self.done = False
+        self.error = None
+        self.followers = 0
+        self.updated = clock()
+
+    def _notify(self):
+        self.updated = self._clock()
+        self._cond.notify_all()
+        for loop, event in self._loops:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:  # that event loop has been closed
+                pass
+
+    def publish(self, text):
+        with self._cond:
+            self.parts.append(text)
+            self._notify()
+
+    def finish(self, error=None):
+        with self._cond:
+            if not self.done:
+                self.done = True
+                self.error = error
+                self._notify()
+
+    def _take(self, sent):
+        """Parts after the first `sent`; raises the call's error once everything is taken."""
+        new = self.parts[sent:]
+        if not new and self.done and self.error is not None:
+            raise self.error
+        return new
+
+    def follow(self, timeout):
+        """Yield the answer's parts as they arrive, waiting at most `timeout` seconds for each."""
+        sent = 0
+        while True:
+            with self._cond:
+                deadline = self._clock() + timeout
+                while sent == len(self.parts) and not self.done:
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        raise CoalesceTimeout(f"shared Gemini call made no progress in {timeout}s")
+                    self._cond.wait(remaining)
+                new = self._take(sent)
+            if not new:
+                return
+            sent += len(new)
+            yield from new
+
+    async def follow_async(self, timeout):
+        """Async version of follow() for the event loop (no thread is held while waiting)."""
+        event = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), event)
+        with self._cond:
+            self._loops.append(waiter)
+        try:
+            sent = 0
+            while True:
+                with self._cond:
+                    new = self._take(sent)
+                    done = self.done
+                    if not new and not done:
+                        event.clear()
+                if new:
+                    sent += len(new)
+                    for text in new:
+                        yield text
+                elif done:
+                    return
+                else:
+                    try:
+                        await asyncio.wait_for(event.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        raise CoalesceTimeout(f"shared Gemini call made no progress in {timeout}s") from None
+        finally:
+            with self._cond:
+                self._loops.remove(waiter)
+
+
+class Coalescer:
+    """Single-flight for Gemini calls: concurrent requests with the same key share one call.
+
+    The first request for a key leads: it makes the call and publishes the answer to the
+    flight (share() for a whole answer, broadcast() for a stream). Requests arriving while it
+    runs follow the flight instead of calling Gemini, and get the leader's error if it fails.
+    A flight takes at most `max_followers`, after which the next request leads a new one, and
+    followers give up with CoalesceTimeout after `wait_timeout` seconds without progress. A key
+    of None is never shared.
+    """
+
+    def __init__(self, max_followers=100, wait_timeout=45.0, clock=time.monotonic):
+        self.max_followers = max_followers
+        self.wait_timeout = wait_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def join(self, key):
+        """(flight, leader): lead a new flight, or follow the one already running for the key."""
+        with self._lock:
+            flight = self._flights.get(key) if key is not None else None
+            if (flight is not None and not flight.done and flight.followers < self.max_followers
+                    and self._clock() - flight.updated < self.wait_timeout):
+                flight.followers += 1
+                self.coalesced += 1
+                return flight, False
+            flight = Flight(key, self._clock)
+            if key is not None:
+                self._flights[key] = flight
+            self.leaders += 1
+            return flight, True
+
+    def finish(self, flight, error=None):
+        flight.finish(error)
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    @contextmanager
+    def lead(self, flight):
+        """Fail the flight for its followers if the leader's block raises."""
+        try:
+            yield flight
+        except Exception as e:
+            self.finish(flight, e)
+            raise
+        except BaseException:
+            self.finish(flight, CoalesceAborted("the request making the shared call was cancelled"))
+            raise
+
+    def share(self, flight, text):
+        """Publish the leader's whole answer and end the flight."""
+        flight.publish(text)
+        self.finish(flight)
+
+    def broadcast(self, flight, texts):
+        """Pass the leader's streamed parts through, publishing each to the followers."""
+        with self.lead(flight):
+            for text in texts:
+                flight.publish(text)
+                yield text
+        self.finish(flight)
+
+    async def broadcast_async(self, flight, texts):
+        with self.lead(flight):
+            async for text in texts:
+                flight.publish(text)
+                yield text
+        self.finish(flight)
+
+    def follow(self, flight):
+        try:
+            yield from flight.follow(self.wait_timeout)
+        except CoalesceTimeout:
+            self._timed_out()
+            raise
+
+    async def follow_async(self, flight):
+        try:
+            async for text in flight.follow_async(self.wait_timeout):
+                yield text
+        except CoalesceTimeout:
+            self._timed_out()
+            raise
+
+    def wait(self, flight):
+        """The leader's whole answer."""
+        return "".join(self.follow(flight))
+
+    async def wait_async(self, flight):
+        return "".join([text async for text in self.follow_async(flight)])
+
+    def _timed_out(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def stats(self):
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+        }
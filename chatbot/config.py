@@ -0,0 +1,138 @@
+import os
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def env_float(name, default):
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def env_bool(name, default):
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Knowledge base file, and how often (seconds) to check it for edits; 0 disables hot reload
+INFO_PATH = os.getenv('INFO_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                'data', 'info.json'))
+INFO_RELOAD_INTERVAL = env_float('INFO_RELOAD_INTERVAL', 5.0)
+
+# Retrieval: how many INFO sections to send, and the share of the question's words (IDF-weighted)
+# they must contain; below that we send everything
+RETRIEVAL_TOP_K = env_int('RETRIEVAL_TOP_K', 3)
+RETRIEVAL_MIN_COVERAGE = env_float('RETRIEVAL_MIN_COVERAGE', 0.6)
+
+# Per-visitor chat sessions
+SESSION_COOKIE = os.getenv('SESSION_COOKIE', 'olfu_session')
+SESSION_MAX = env_int('SESSION_MAX', 5000)
+SESSION_IDLE_TTL = env_int('SESSION_IDLE_TTL', 1800)
+SESSION_MAX_TURNS = env_int('SESSION_MAX_TURNS', 10)
+SESSION_MAX_TOKENS = env_int('SESSION_MAX_TOKENS', 6000)
+
+# Where sessions and cached answers are shared between workers: "memory" (per process),
+# "sqlite:///path/to/state.db" (one machine) or "redis://host:6379/0"
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'memory')
+
+# Response cache for repeated questions. CACHE_FUZZY_THRESHOLD (e.g. 0.9) also serves the answer
+# of a near-identical cached question; off by default, since a small edit can change the question
+CACHE_MAX_ENTRIES = env_int('CACHE_MAX_ENTRIES', 1000)
+CACHE_TTL = env_int('CACHE_TTL', 3600)
+CACHE_FUZZY_THRESHOLD = env_float('CACHE_FUZZY_THRESHOLD', 0.0)
+
+# Token budgets per Gemini request: input (system prompt + history + context + question) and
+# output, smaller for factual questions than for open-ended ones; MAX_OUTPUT_TOKENS caps both.
+# MAX_INPUT_TOKENS is raised to fit the system prompt plus a MAX_MESSAGE_CHARS question.
+MAX_INPUT_TOKENS = env_int('MAX_INPUT_TOKENS', 8000)
+MAX_OUTPUT_TOKENS = env_int('MAX_OUTPUT_TOKENS', 4096)
+OUTPUT_TOKENS_FACTUAL = min(env_int('OUTPUT_TOKENS_FACTUAL', 512), MAX_OUTPUT_TOKENS)
+OUTPUT_TOKENS_OPEN = min(env_int('OUTPUT_TOKENS_OPEN', 1024), MAX_OUTPUT_TOKENS)
+
+# Local intent routing: answer deterministic questions from INFO without calling Gemini
+INTENT_ROUTING = env_bool('INTENT_ROUTING', True)
+INTENT_MIN_CONFIDENCE = env_float('INTENT_MIN_CONFIDENCE', 0.75)
+INTENT_MAX_WORDS = env_int('INTENT_MAX_WORDS', 14)
+
+# Replace Gemini with a local stub (chatbot/stub.py) for load tests
+GEMINI_STUB = env_bool('GEMINI_STUB', False)
+GEMINI_STUB_LATENCY = env_float('GEMINI_STUB_LATENCY', 0.8)
+GEMINI_STUB_TOKENS_PER_SECOND = env_float('GEMINI_STUB_TOKENS_PER_SECOND', 50.0)
+GEMINI_STUB_ERROR_RATE = env_float('GEMINI_STUB_ERROR_RATE', 0.0)
+
+# Create the Gemini model in a background thread at startup instead of on the first chat
+# (leave off for serverless, where /api/warmup can be pinged instead)
+WARMUP_ON_START = env_bool('WARMUP_ON_START', False)
+
+# Async serving (asgi.py): in-flight Gemini calls per process and requests allowed to queue
+ASYNC_MAX_CONCURRENCY = env_int('ASYNC_MAX_CONCURRENCY', 200)
+ASYNC_MAX_QUEUE = env_int('ASYNC_MAX_QUEUE', 1000)
+ASYNC_QUEUE_TIMEOUT = env_float('ASYNC_QUEUE_TIMEOUT', 15.0)
+
+# Gemini client guard rails: request rate, per-call timeout, retries and circuit breaker
+UPSTREAM_RATE = env_float('UPSTREAM_RATE', 10.0)
+UPSTREAM_BURST = env_int('UPSTREAM_BURST', 20)
+UPSTREAM_QUEUE_TIMEOUT = env_float('UPSTREAM_QUEUE_TIMEOUT', 5.0)
+UPSTREAM_TIMEOUT = env_float('UPSTREAM_TIMEOUT', 30.0)
+# Longest wait for the next chunk of a streamed answer
+UPSTREAM_CHUNK_TIMEOUT = env_float('UPSTREAM_CHUNK_TIMEOUT', 15.0)
+UPSTREAM_MAX_RETRIES = env_int('UPSTREAM_MAX_RETRIES', 2)
+UPSTREAM_RETRY_BASE_DELAY = env_float('UPSTREAM_RETRY_BASE_DELAY', 0.5)
+UPSTREAM_RETRY_MAX_DELAY = env_float('UPSTREAM_RETRY_MAX_DELAY', 8.0)
+UPSTREAM_MAX_WORKERS = env_int('UPSTREAM_MAX_WORKERS', 64)
+BREAKER_FAILURE_THRESHOLD = env_int('BREAKER_FAILURE_THRESHOLD', 5)
+BREAKER_RESET_TIMEOUT = env_float('BREAKER_RESET_TIMEOUT', 30.0)
+
+# Single-flight: identical cacheable opening questions asked while Gemini is answering one of
+# them wait for that answer instead of making their own call (at most COALESCE_MAX_FOLLOWERS
+# per call)
+COALESCE = env_bool('COALESCE', True)
+COALESCE_MAX_FOLLOWERS = env_int('COALESCE_MAX_FOLLOWERS', 100)
+COALESCE_WAIT_TIMEOUT = env_float('COALESCE_WAIT_TIMEOUT', 45.0)
+
+# /api/chat/batch: messages per request and Gemini calls run at once for batches (per process)
+BATCH_MAX_MESSAGES = env_int('BATCH_MAX_MESSAGES', 50)
+BATCH_MAX_CONCURRENCY = env_int('BATCH_MAX_CONCURRENCY', 8)
+
+# Log chat requests slower than this many seconds with their stage breakdown (0 disables)
+SLOW_REQUEST_SECONDS = env_float('SLOW_REQUEST_SECONDS', 5.0)
+
+# HTTP caching: static files get content-hash URLs cached for STATIC_MAX_AGE seconds; bodies of
+# at least COMPRESS_MIN_BYTES are pre-compressed (gzip, and brotli if installed)
+STATIC_MAX_AGE = env_int('STATIC_MAX_AGE', 31536000)
+STATIC_RELOAD_INTERVAL = env_float('STATIC_RELOAD_INTERVAL', 2.0)
+COMPRESS_MIN_BYTES = env_int('COMPRESS_MIN_BYTES', 512)
+CAMPUS_IMAGES_MAX_AGE = env_int('CAMPUS_IMAGES_MAX_AGE', 3600)
+
+# Conversation analytics: one JSON line per chat turn under ANALYTICS_DIR ("" disables), written
+# in batches by a background thread; records are dropped, never waited for, once
+# ANALYTICS_MAX_QUEUE are pending. Summarize with `python -m chatbot.analytics_report`.
+ANALYTICS_DIR = os.getenv('ANALYTICS_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                        'logs'))
+ANALYTICS_MAX_QUEUE = env_int('ANALYTICS_MAX_QUEUE', 10000)
+ANALYTICS_BATCH_SIZE = env_int('ANALYTICS_BATCH_SIZE', 256)
+ANALYTICS_FLUSH_INTERVAL = env_float('ANALYTICS_FLUSH_INTERVAL', 2.0)
+ANALYTICS_MAX_FILE_BYTES = env_int('ANALYTICS_MAX_FILE_BYTES', 50 * 1024 * 1024)
+ANALYTICS_KEEP_FILES = env_int('ANALYTICS_KEEP_FILES', 20)
+
+# Admission control for chat requests, checked before any work: per-IP and per-session token
+# buckets (requests/second and burst; 0 disables), the longest message accepted, and how many
+# chat requests may be in flight per process. Rejected requests get 429 (413 for long messages).
+# The in-flight ceiling depends on the server: ADMISSION_MAX_CONCURRENT for the Flask app, and
+# ADMISSION_MAX_CONCURRENT_ASYNC for asgi.py, where it defaults to the Gemini slots plus the
+# queue (ASYNC_MAX_CONCURRENCY + ASYNC_MAX_QUEUE) so the queue can fill before requests are shed.
+ADMISSION_IP_RATE = env_float('ADMISSION_IP_RATE', 2.0)
+ADMISSION_IP_BURST = env_int('ADMISSION_IP_BURST', 30)
+ADMISSION_SESSION_RATE = env_float('ADMISSION_SESSION_RATE', 0.5)
+ADMISSION_SESSION_BURST = env_int('ADMISSION_SESSION_BURST', 10)
+ADMISSION_MAX_CONCURRENT = env_int('ADMISSION_MAX_CONCURRENT', 256)
+ADMISSION_MAX_CONCURRENT_ASYNC = env_int('ADMISSION_MAX_CONCURRENT_ASYNC', ASYNC_MAX_CONCURRENCY + ASYNC_MAX_QUEUE)
+ADMISSION_MAX_CLIENTS = env_int('ADMISSION_MAX_CLIENTS', 100000)
+MAX_MESSAGE_CHARS = env_int('MAX_MESSAGE_CHARS', 2000)
+MAX_BODY_BYTES = env_int('MAX_BODY_BYTES', 64 * 1024)
+# Proxies in front of the app that append to X-Forwarded-For (0: use the connection's address)
+TRUSTED_PROXY_HOPS = env_int('TRUSTED_PROXY_HOPS', 0)
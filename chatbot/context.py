@@ -0,0 +1,176 @@
+import hashlib
+import json
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from chatbot import config
+from chatbot.intents import IntentRouter
+from chatbot.retrieval import BM25Index, tokenize
+
+# Heading placed in front of the formatted knowledge base
+CONTEXT_HEADER = "Information about OLFU Antipolo Senior High School:\n\n"
+
+
+def estimate_tokens(text):
+    """Cheap local token estimate (Gemini averages about 4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+# One retrievable piece of INFO: a top-level key, or one entry of a nested dict like "strands"
+Section = namedtuple('Section', ['key', 'parent', 'text'])
+
+
+def split_sections(info):
+    sections = []
+    for key, value in info.items():
+        if isinstance(value, dict):
+            for sub_key, sub_value in value.items():
+                sections.append(Section(sub_key, key, str(sub_value)))
+        else:
+            sections.append(Section(key, None, str(value)))
+    return sections
+
+
+def format_sections(sections):
+    """Format sections (in INFO order) the same way the chat prompt has always shown them."""
+    parts = [CONTEXT_HEADER]
+    parent = None
+    for section in sections:
+        if section.parent is None:
+            parts.append(f"{section.key}: {section.text}\n\n")
+        else:
+            if section.parent != parent:
+                parts.append(f"{section.parent}:\n")
+            parts.append(f"  {section.key}: {section.text}\n\n")
+        parent = section.parent
+    return "".join(parts)
+
+
+def _section_document(section):
+    # Index the key (twice, to weight it) and the parent key so "tuition fees" finds tuition_fees
+    title = section.key.replace("_", " ")
+    parent = (section.parent or "").replace("_", " ")
+    return f"{parent} {title} {title} {section.text}"
+
+
+# Acknowledgement used to open a conversation when the SDK has no system instruction support
+SETUP_ACK = "Understood. I will follow these instructions for the rest of this conversation."
+
+
+def freeze_info(info):
+    """Read-only view of INFO (and its nested groups) to share between requests."""
+    return MappingProxyType({key: MappingProxyType(dict(value)) if isinstance(value, dict) else value
+                             for key, value in info.items()})
+
+
+def format_prompt_prefix(context_text):
+    """Knowledge-base preamble that comes before the user's question in a chat turn."""
+    return (
+        "Here is information about OLFU Antipolo Senior High School that you should use to answer:\n"
+        f"{context_text}"
+    )
+
+
+def format_prompt(prompt_prefix, user_message):
+    return f"{prompt_prefix}\nUser question: {user_message}"
+
+
+def format_setup_history(system_prompt):
+    """Opening exchange that carries the system prompt once per conversation."""
+    return (
+        {"role": "user", "parts": [system_prompt]},
+        {"role": "model", "parts": [SETUP_ACK]},
+    )
+
+
+def content_version(info, system_prompt=""):
+    """Short stable hash of the knowledge base (and instructions) used as a version tag."""
+    payload = json.dumps([system_prompt, info], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class CompiledContext:
+    """Immutable, prebuilt prompt context, section index and intent router for one INFO version."""
+
+    __slots__ = ('info', 'system_prompt', 'setup_history', 'sections', 'index', 'router', 'text',
+                 'prompt_prefix', 'version', 'byte_size', 'token_estimate')
+
+    def __init__(self, system_prompt, sections, version, info=None):
+        text = format_sections(sections)
+        prompt_prefix = format_prompt_prefix(text)
+        object.__setattr__(self, 'info', freeze_info(info or {}))
+        object.__setattr__(self, 'system_prompt', system_prompt)
+        object.__setattr__(self, 'setup_history', format_setup_history(system_prompt))
+        object.__setattr__(self, 'sections', tuple(sections))
+        object.__setattr__(self, 'index', BM25Index([_section_document(s) for s in sections]))
+        object.__setattr__(self, 'router', IntentRouter(
+            sections, min_confidence=config.INTENT_MIN_CONFIDENCE, max_words=config.INTENT_MAX_WORDS))
+        object.__setattr__(self, 'text', text)
+        object.__setattr__(self, 'prompt_prefix', prompt_prefix)
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'byte_size', len(prompt_prefix.encode('utf-8')))
+        object.__setattr__(self, 'token_estimate', estimate_tokens(prompt_prefix))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledContext is immutable")
+
+    def select_sections(self, user_message, top_k=None, min_coverage=None):
+        """Top-k sections for the message in INFO order, or None when retrieval isn't confident."""
+        top_k = config.RETRIEVAL_TOP_K if top_k is None else top_k
+        min_coverage = config.RETRIEVAL_MIN_COVERAGE if min_coverage is None else min_coverage
+        ranked = self.index.search(user_message, top_k)
+        chosen = {doc_id for doc_id, _ in ranked}
+        if not ranked or self.index.coverage(user_message, chosen) < min_coverage:
+            return None
+        # Asking about a group ("what strands do you offer?") pulls in every entry of that group,
+        # and naming a section ("enrollment requirements") pulls in that section
+        terms = set(tokenize(user_message))
+        for doc_id, section in enumerate(self.sections):
+            if section.parent is not None and terms.intersection(tokenize(section.parent)):
+                chosen.add(doc_id)
+            title = set(tokenize(section.key.replace("_", " ")))
+            if title and title <= terms:
+                chosen.add(doc_id)
+        return [self.sections[doc_id] for doc_id in sorted(chosen)]
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "sections": len(self.sections),
+            "bytes": self.byte_size,
+            "tokens": self.token_estimate,
+            "system_tokens": estimate_tokens(self.system_prompt),
+        }
+
+
+def compile_context(info, system_prompt):
+    return CompiledContext(
+        system_prompt=system_prompt,
+        sections=split_sections(info),
+        version=content_version(info, system_prompt),
+        info=info,
+    )
+
+
+class KnowledgeContext:
+    """Holds the current CompiledContext and swaps it atomically when INFO changes."""
+
+    def __init__(self, info, system_prompt):
+        self._lock = threading.Lock()
+        self._system_prompt = system_prompt
+        self._compiled = compile_context(info, system_prompt)
+
+    @property
+    def current(self):
+        return self._compiled
+
+    def update(self, info, system_prompt=None):
+        """Rebuild the context after INFO (or the system prompt) changes."""
+        with self._lock:
+            if system_prompt is not None:
+                self._system_prompt = system_prompt
+            compiled = compile_context(info, self._system_prompt)
+            if compiled.version != self._compiled.version:
+                self._compiled = compiled
+            return self._compiled
@@ -0,0 +1,204 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are built without it
+    brotli = None
+
+# Only text-like bodies are worth compressing; images are already compressed
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+# "script.3f9a1c2b7d4e.js": the original name with 12 hex digits of the content hash
+FINGERPRINT_RE = re.compile(r"^(?P<stem>.+)\.(?P<digest>[0-9a-f]{12})(?P<ext>\.[^./]+)$")
+
+IMMUTABLE = "public, max-age={max_age}, immutable"
+REVALIDATE = "public, no-cache"
+
+
+def _encoders():
+    encoders = {}
+    if brotli is not None:
+        encoders["br"] = lambda body: brotli.compress(body, quality=11)
+    encoders["gzip"] = lambda body: gzip.compress(body, compresslevel=9, mtime=0)
+    return encoders
+
+
+ENCODERS = _encoders()
+
+
+def accepted_encodings(header):
+    """Codings the client accepts (q > 0) from an Accept-Encoding header value."""
+    accepted = set()
+    for item in (header or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    if "*" in accepted:
+        accepted.update(ENCODERS)
+    return accepted
+
+
+class CachedBody:
+    """A response body built once: strong ETag, Cache-Control and compressed variants.
+
+    Variants are compressed on first use and kept only if smaller than the original; each has
+    its own ETag (RFC 9110 treats differently encoded bodies as different representations).
+    """
+
+    def __init__(self, body, mimetype, cache_control, min_compress_bytes=512):
+        self.body = body
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.etag = f'"{self.digest[:20]}"'
+        self.compressible = len(body) >= min_compress_bytes and mimetype.startswith(COMPRESSIBLE_TYPES)
+        self._lock = threading.Lock()
+        self._variants = {}
+
+    def _variant(self, encoding):
+        variant = self._variants.get(encoding, False)
+        if variant is False:
+            with self._lock:
+                variant = self._variants.get(encoding, False)
+                if variant is False:
+                    compressed = ENCODERS[encoding](self.body)
+                    variant = compressed if len(compressed) < len(self.body) else None
+                    self._variants[encoding] = variant
+        return variant
+
+    def negotiate(self, accept_encoding):
+        """(encoding, body, etag) for the client; encoding is None when sent uncompressed."""
+        if self.compressible:
+            accepted = accepted_encodings(accept_encoding)
+            for encoding in ENCODERS:
+                if encoding in accepted:
+                    variant = self._variant(encoding)
+                    if variant is not None:
+                        return encoding, variant, f'"{self.digest[:20]}-{encoding}"'
+        return None, self.body, self.etag
+
+    def not_modified(self, if_none_match):
+        """True when an If-None-Match header names this body in any encoding."""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag.strip('"').split("-")[0] == self.digest[:20]:
+                return True
+        return False
+
+
+class StaticAssets:
+    """The static folder held in memory, with content-hash fingerprinted URLs.
+
+    url("script.js") gives "/static/script.3f9a1c2b7d4e.js"; that URL is served with a
+    year-long immutable Cache-Control, so browsers only fetch it again after the file changes.
+    Plain names keep working but must be revalidated (ETag, 304). The folder is checked for
+    edits at most every `check_interval` seconds (0 disables the check).
+    """
+
+    def __init__(self, folder, url_prefix="/static", max_age=31536000, min_compress_bytes=512,
+                 check_interval=2.0, clock=time.monotonic):
+        self.folder = folder
+        self.url_prefix = url_prefix.rstrip("/")
+        self.max_age = max_age
+        self.min_compress_bytes = min_compress_bytes
+        self.check_interval = check_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._files = {}
+        self._mtimes = {}
+        self.version = ""
+        self.reloads = 0
+        self._scan()
+        self._checked = clock()
+
+    def _scan(self):
+        mtimes = {}
+        for root, _, names in os.walk(self.folder):
+            for name in names:
+                path = os.path.join(root, name)
+                mtimes[os.path.relpath(path, self.folder).replace(os.sep, "/")] = os.stat(path).st_mtime_ns
+        if mtimes == self._mtimes:
+            return False
+        files = {}
+        for name, mtime in mtimes.items():
+            entry = self._files.get(name)
+            if entry is None or self._mtimes.get(name) != mtime:
+                with open(os.path.join(self.folder, name), "rb") as f:
+                    body = f.read()
+                mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                entry = CachedBody(body, mimetype, REVALIDATE, self.min_compress_bytes)
+            files[name] = entry
+        self._files, self._mtimes = files, mtimes
+        self.version = hashlib.sha256("".join(
+            f"{name}:{entry.digest}" for name, entry in sorted(files.items())).encode()).hexdigest()[:16]
+        return True
+
+    def refresh(self):
+        if not self.check_interval or self._clock() - self._checked < self.check_interval:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._checked = self._clock()
+            if self._scan():
+                self.reloads += 1
+                print(f"Static assets changed: version {self.version}")
+        except OSError as e:
+            print(f"Keeping static assets version {self.version}: {e}")
+        finally:
+            self._lock.release()
+
+    def fingerprint(self, filename):
+        entry = self._files.get(filename)
+        if entry is None:
+            return filename
+        stem, ext = os.path.splitext(filename)
+        return f"{stem}.{entry.digest[:12]}{ext}"
+
+    def url(self, filename):
+        """Fingerprinted URL of a static file (the plain URL if there is no such file)."""
+        self.refresh()
+        return f"{self.url_prefix}/{self.fingerprint(filename)}"
+
+    def get(self, path):
+        """(CachedBody, cache_control) for a requested path, or None if there is no such file.
+
+        A fingerprint that no longer matches (a page rendered before the file changed) still
+        gets the current file, but without the immutable Cache-Control.
+        """
+        self.refresh()
+        entry = self._files.get(path)
+        if entry is not None:
+            return entry, REVALIDATE
+        match = FINGERPRINT_RE.match(path)
+        if match is None:
+            return None
+        entry = self._files.get(match.group("stem") + match.group("ext"))
+        if entry is None:
+            return None
+        if entry.digest[:12] == match.group("digest"):
+            return entry, IMMUTABLE.format(max_age=self.max_age)
+        return entry, REVALIDATE
+
+    def __len__(self):
+        return len(self._files)
@@ -0,0 +1,143 @@
+import re
+from collections import namedtuple
+
+from chatbot.cache import CACHE_STOPWORDS, is_cacheable
+from chatbot.keywords import KeywordMatcher
+
+# sections: INFO keys whose text answers the intent; "parent/prefix" picks entries of a nested
+# dict such as strands. direct: safe to answer with that text alone, without asking Gemini.
+Intent = namedtuple('Intent', ['name', 'patterns', 'sections', 'direct'])
+
+INTENTS = [
+    Intent("contact_info", ["contact*", "phone", "telephone", "email", "e-mail", "hotline",
+                            "call you", "facebook", "website", "reach you"], ["contact_info"], True),
+    Intent("important_dates", ["important dates", "deadline*", "start of classes", "classes start",
+                               "enrollment period", "orientation day", "school opening",
+                               "opening of classes", "dates", "when does", "when is",
+                               "when will", "start*", "begin*"], ["important_dates"], True),
+    Intent("requirements", ["requirement*", "documents", "what do i need", "report card",
+                            "birth certificate", "good moral", "form 137", "f-137", "f-138"],
+           ["requirements"], True),
+    Intent("misc_fees", ["miscellaneous", "misc", "misc fee*", "other fees", "uniform*",
+                         "pe uniform*", "canvas account", "application fee"], ["misc_fees"], True),
+    Intent("tuition_fees", ["tuition*", "fee*", "cost*", "price*", "minimum fee",
+                            "down payment"], ["tuition_fees"], True),
+    Intent("tuition_breakdown", ["breakdown", "computation", "compute", "balance", "total tuition",
+                                 "non-voucher", "esc grantee"], ["tuition_breakdown"], False),
+    Intent("payment_modes", ["payment*", "installment*", "pay", "monthly", "quarterly",
+                             "semestral", "full payment", "mode of payment", "modes of payment"],
+           ["payment_modes"], True),
+    Intent("enrollment_process", ["enrol*", "how to enroll", "enrollment process",
+                                  "enrollment steps", "steps to enroll"], ["enrollment_process"], True),
+    Intent("scholarships", ["scholarship*", "financial aid", "grant*", "discount*"],
+           ["scholarships"], True),
+    Intent("scholarship_details", ["scholarship requirement*", "qualify", "qualifying exam",
+                                   "honor student*", "gwa", "audition"], ["scholarship_details"], False),
+    Intent("faqs", ["entrance exam*", "exam*", "dorm*", "transferee*", "shift*", "school hours",
+                    "class hours", "what time"], ["faqs"], False),
+    Intent("facilities", ["facilit*", "library", "clinic", "laborator*", "lab", "labs", "gym*",
+                          "cafeteria", "canteen", "wifi", "auditorium", "campus look*"],
+           ["facilities"], True),
+    Intent("learning_modes", ["learning mode*", "modalit*", "online class*", "face to face",
+                              "face-to-face", "blended", "lms"], ["learning_modes"], True),
+    Intent("shs_voucher_policy", ["voucher*", "esc", "qvr", "voucher policy"],
+           ["shs_voucher_policy"], True),
+    Intent("voucher_program_details", ["voucher program", "shs vp", "voucher value*",
+                                       "voucher amount*"], ["voucher_program_details"], False),
+    Intent("location_details", ["location", "located", "address", "where is", "where are",
+                                "directions", "map", "how to get there", "landmark*", "jeep*",
+                                "commute", "parking", "gps"], ["location_details"], True),
+    Intent("shs_vision_mission", ["vision", "mission"], ["shs_vision_mission"], True),
+    Intent("shs_plus_program", ["shs plus", "plus program", "college credit*"],
+           ["shs_plus_program"], True),
+    Intent("shs_regular_program", ["regular program", "regular shs"], ["shs_regular_program"], True),
+    Intent("student_life", ["club*", "organization*", "student life", "extracurricular*",
+                            "intramurals", "student council", "events"], ["student_life"], True),
+    Intent("application_process", ["apply", "application", "application process", "how to apply",
+                                   "online application"], ["application_process"], True),
+    Intent("shs_curriculum", ["curriculum", "subjects", "core subjects", "courses"],
+           ["shs_curriculum"], True),
+    Intent("strands", ["strand*", "track*", "programs offered", "what programs"], ["strands/"], True),
+    Intent("strand_abm", ["abm", "accountancy", "business"], ["strands/ABM"], True),
+    Intent("strand_stem", ["stem", "engineering"], ["strands/STEM"], True),
+    Intent("strand_humss", ["humss", "humanities", "social science*"], ["strands/HumSS"], True),
+    Intent("strand_gas", ["gas", "general academic"], ["strands/GAS"], True),
+]
+
+# Phrasings that ask for advice or comparison rather than a fact from INFO
+_OPEN_ENDED_RE = re.compile(
+    r"\b(why|should|recommend\w*|suggest\w*|compare|comparison|difference|better|best|vs|versus|"
+    r"explain|if i|what if|which one|help me (choose|decide))\b",
+    re.IGNORECASE,
+)
+
+
+def is_open_ended(message):
+    return _OPEN_ENDED_RE.search(message) is not None
+
+
+# Words that say nothing about what is asked: a question is only as clear as the share of its
+# other words that intent keywords cover ("is there a gas station near" is not about GAS)
+FILLER_WORDS = CACHE_STOPWORDS | frozenset("""
+what whats s how much many where when which who tell know want need give show list info information
+details about more have has offer offers offered accept provide available join any some options option
+number olfu fatima lady antipolo university shs senior high school schools campus admission admissions
+office
+""".split())
+
+
+IntentMatch = namedtuple('IntentMatch', ['name', 'confidence', 'direct', 'answer'])
+
+
+class IntentRouter:
+    """Classifies a message against INTENTS and answers deterministic ones straight from INFO."""
+
+    def __init__(self, sections, intents=INTENTS, min_confidence=0.75, max_words=14):
+        self.min_confidence = min_confidence
+        self.max_words = max_words
+        self.intents = {intent.name: intent for intent in intents}
+        self.matcher = KeywordMatcher((intent.name, intent.patterns) for intent in intents)
+        self._answers = {intent.name: self._answer_text(sections, intent) for intent in intents}
+
+    @staticmethod
+    def _answer_text(sections, intent):
+        texts = []
+        for wanted in intent.sections:
+            parent, _, prefix = wanted.rpartition("/")
+            for section in sections:
+                if parent and section.parent == parent and section.key.startswith(prefix):
+                    texts.append(f"{section.key}\n{section.text}")
+                elif not parent and section.parent is None and section.key == prefix:
+                    texts.append(section.text)
+        return "\n\n".join(texts) or None
+
+    def classify(self, message):
+        """Best intent for the message, or None when no intent keywords match.
+
+        confidence is the intent's share of the keywords found times the share of the message's
+        words (other than FILLER_WORDS) that keywords cover, so one incidental keyword in a
+        longer question scores low.
+        """
+        scores, coverage = self.matcher.scores_with_coverage(message, FILLER_WORDS)
+        if not scores:
+            return None
+        name = max(scores, key=lambda label: (scores[label], label))
+        confidence = scores[name] / sum(scores.values()) * coverage
+        intent = self.intents[name]
+        return IntentMatch(name, confidence, intent.direct, self._answers[name])
+
+    def route(self, message):
+        """IntentMatch to answer locally, or None when the question should go to Gemini.
+
+        Messages with personal details (see chatbot.cache.is_cacheable) are never routed: the
+        visitor is introducing themselves, not asking for INFO.
+        """
+        if not is_cacheable(message):
+            return None
+        match = self.classify(message)
+        if (match is None or not match.direct or match.answer is None
+                or match.confidence < self.min_confidence
+                or len(message.split()) > self.max_words
+                or is_open_ended(message)):
+            return None
+        return match
@@ -0,0 +1,133 @@
+import re
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _split(text):
+    """Lowercase words of the text and the separator after each word but the last: " " for
+    any whitespace, otherwise the literal characters (so "e-mail" keeps its hyphen)."""
+    text = text.lower()
+    words, gaps = [], []
+    end = None
+    for match in _WORD_RE.finditer(text):
+        if end is not None:
+            gap = text[end:match.start()]
+            gaps.append(" " if gap.isspace() else gap)
+        words.append(match.group())
+        end = match.end()
+    return words, gaps
+
+
+class _WordState:
+    """Trie state expecting the next word of a pattern."""
+
+    __slots__ = ('words', 'prefixes', 'longest_prefix')
+
+    def __init__(self):
+        self.words = {}
+        self.prefixes = {}
+        self.longest_prefix = 0
+
+
+class _GapState:
+    """Trie state after a whole word: a pattern may end here or continue past a separator."""
+
+    __slots__ = ('pattern', 'gaps')
+
+    def __init__(self):
+        self.pattern = None
+        self.gaps = {}
+
+
+class KeywordMatcher:
+    """Matches a whole table of keyword patterns in a single pass over the words of the text.
+
+    rules is an iterable of (label, patterns). Patterns are lowercase words or phrases, with an
+    optional trailing "*" for prefix matches ("scholarship*"). Longer patterns are tried
+    first, so "application fee" wins over "application" at the same position. Patterns are
+    compiled into a word trie, so matching costs the same for ten rules or a thousand.
+    """
+
+    def __init__(self, rules):
+        labels_by_pattern = {}
+        for label, patterns in rules:
+            for pattern in patterns:
+                labels_by_pattern.setdefault(pattern.lower(), []).append(label)
+        self.patterns = sorted(labels_by_pattern, key=lambda p: (-len(p), p))
+        self._labels = [tuple(labels_by_pattern[pattern]) for pattern in self.patterns]
+        self._weights = [len(pattern.split()) for pattern in self.patterns]
+        self._root = _WordState()
+        for index, pattern in enumerate(self.patterns):
+            self._add(index, pattern)
+
+    def _add(self, index, pattern):
+        prefix = pattern.endswith("*")
+        words, gaps = _split(pattern.rstrip("*"))
+        if not words:
+            return
+        state = self._root
+        for i, word in enumerate(words):
+            if prefix and i == len(words) - 1:
+                # Earlier (longer) patterns win, as with alternation order
+                state.prefixes.setdefault(word, index)
+                state.longest_prefix = max(state.longest_prefix, len(word))
+                return
+            after = state.words.get(word)
+            if after is None:
+                after = state.words[word] = _GapState()
+            if i == len(words) - 1:
+                if after.pattern is None:
+                    after.pattern = index
+                return
+            state = after.gaps.get(gaps[i])
+            if state is None:
+                state = after.gaps[gaps[i]] = _WordState()
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def _find(self, words, gaps):
+        """(index, first word, end word) of the non-overlapping patterns found, left to right."""
+        i, count = 0, len(words)
+        while i < count:
+            best, best_end = None, i + 1
+            state, j = self._root, i
+            while j < count:
+                word = words[j]
+                if state.prefixes:
+                    for length in range(1, min(len(word), state.longest_prefix) + 1):
+                        index = state.prefixes.get(word[:length])
+                        if index is not None and (best is None or index < best):
+                            best, best_end = index, j + 1
+                after = state.words.get(word)
+                if after is None:
+                    break
+                if after.pattern is not None and (best is None or after.pattern < best):
+                    best, best_end = after.pattern, j + 1
+                state = after.gaps.get(gaps[j]) if j < count - 1 else None
+                if state is None:
+                    break
+                j += 1
+            if best is not None:
+                yield best, i, best_end
+            i = best_end
+
+    def matches(self, text):
+        """Patterns found in the text, in order, as (pattern, labels) pairs."""
+        return [(self.patterns[index], self._labels[index]) for index, _, _ in self._find(*_split(text))]
+
+    def scores(self, text):
+        """Label -> summed weight of its matched patterns (multi-word phrases count more)."""
+        return self.scores_with_coverage(text)[0]
+
+    def scores_with_coverage(self, text, ignore=frozenset()):
+        """scores() and the share of the text's words, other than those in `ignore`, that
+        matched patterns cover (0.0 if there are no such words)."""
+        words, gaps = _split(text)
+        scores, covered = {}, 0
+        for index, start, end in self._find(words, gaps):
+            covered += sum(word not in ignore for word in words[start:end])
+            for label in self._labels[index]:
+                scores[label] = scores.get(label, 0) + self._weights[index]
+        content = sum(word not in ignore for word in words)
+        return scores, covered / content if content else 0.0
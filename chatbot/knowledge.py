@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from chatbot.context import KnowledgeContext
+
+
+class KnowledgeFileError(ValueError):
+    """The knowledge base file is not valid JSON of the expected shape."""
+
+
+def validate_info(info):
+    """INFO is a dict of text values, or of one level of nested {name: text} groups."""
+    if not isinstance(info, dict) or not info:
+        raise KnowledgeFileError("knowledge base must be a non-empty JSON object")
+    for key, value in info.items():
+        if isinstance(value, dict):
+            bad = [sub_key for sub_key, sub_value in value.items() if not isinstance(sub_value, str)]
+            if bad:
+                raise KnowledgeFileError(f"{key}: entries must be text ({', '.join(bad)})")
+        elif not isinstance(value, str):
+            raise KnowledgeFileError(f"{key}: value must be text or an object of text entries")
+
+
+def load_info(path):
+    """Read and validate a knowledge base file; returns (info, sha256 of the file)."""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    try:
+        info = json.loads(raw.decode('utf-8'))
+    except ValueError as e:
+        raise KnowledgeFileError(f"{path}: {e}") from None
+    validate_info(info)
+    return info, hashlib.sha256(raw).hexdigest()
+
+
+class KnowledgeFile(KnowledgeContext):
+    """KnowledgeContext loaded from a JSON file and reloaded when the file changes on disk.
+
+    Reading `current` stats the file at most every `check_interval` seconds (0 disables hot
+    reload). One caller rebuilds the snapshot while everyone else, including requests already
+    holding the old snapshot, keeps using the old one until the new one is swapped in. A file
+    that fails to load is reported and the previous version stays live. `on_change` is called
+    with the new CompiledContext after a swap so caches keyed on the old version can be dropped.
+    """
+
+    def __init__(self, path, system_prompt, check_interval=5.0, on_change=None, clock=time.monotonic):
+        self.path = path
+        self.check_interval = check_interval
+        self.on_change = on_change
+        self._clock = clock
+        self._reload_lock = threading.Lock()
+        self._mtime = os.stat(path).st_mtime_ns
+        info, self.checksum = load_info(path)
+        super().__init__(info, system_prompt)
+        self._checked = clock()
+        self.reloads = 0
+        self.reload_errors = 0
+
+    @property
+    def current(self):
+        if self.check_interval and self._clock() - self._checked >= self.check_interval:
+            self.reload_if_changed()
+        return self._compiled
+
+    def reload_if_changed(self):
+        """Reload the file if its mtime changed; returns True when a new version was swapped in."""
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            self._checked = self._clock()
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                if mtime == self._mtime:
+                    return False
+                # Remember the mtime even if loading fails, so a bad file is reported once
+                self._mtime = mtime
+                info, checksum = load_info(self.path)
+            except (OSError, ValueError) as e:
+                self.reload_errors += 1
+                print(f"Keeping knowledge base version {self._compiled.version}: {e}")
+                return False
+            previous = self._compiled.version
+            compiled = self.update(info)
+            self.checksum = checksum
+            if compiled.version == previous:
+                return False
+            self.reloads += 1
+            print(f"Knowledge base reloaded from {self.path}: version {previous} -> {compiled.version}")
+            if self.on_change is not None:
+                self.on_change(compiled)
+            return True
+        finally:
+            self._reload_lock.release()
@@ -0,0 +1,28 @@
+import threading
+import time
+
+
+class Lazy:
+    """Builds a value with `factory` on first get() and keeps it; concurrent first callers
+    wait for the single build instead of racing. A failed build is retried on the next get()."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded = False
+        self.load_seconds = None
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    started = time.perf_counter()
+                    self._value = self._factory()
+                    self.load_seconds = time.perf_counter() - started
+                    self._loaded = True
+        return self._value
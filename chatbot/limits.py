@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+
+
+class QueueFull(Exception):
+    """Raised when too many requests are already waiting for an upstream slot."""
+
+
+class AsyncConcurrencyLimiter:
+    """Caps in-flight upstream calls and the number of requests queued behind them.
+
+    Use as ``async with limiter:``. Requests beyond max_queue waiting callers, or that wait
+    longer than queue_timeout seconds, raise QueueFull so the caller can shed them.
+    """
+
+    def __init__(self, max_concurrent=100, max_queue=500, queue_timeout=10.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = None
+        self._admitted = 0
+        self.in_flight = 0
+        self.rejected = 0
+
+    @property
+    def waiting(self):
+        return self._admitted - self.in_flight
+
+    async def __aenter__(self):
+        # Created lazily so the semaphore binds to the server's running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        if self._admitted >= self.max_concurrent + self.max_queue:
+            self.rejected += 1
+            raise QueueFull()
+        self._admitted += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._admitted -= 1
+            self.rejected += 1
+            raise QueueFull() from None
+        except BaseException:
+            self._admitted -= 1
+            raise
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.in_flight -= 1
+        self._admitted -= 1
+        self._semaphore.release()
+        return False
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, holding at most `capacity`.
+
+    acquire() reserves a token and sleeps until it is due, so callers are paced in arrival
+    order; it returns False instead when the wait would exceed max_wait.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self.waiting = 0
+
+    def reserve(self, max_wait=0.0):
+        """Seconds until the reserved token is due, or None (nothing reserved) if too long."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            wait = (1 - self._tokens) / self.rate
+            if wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+    def acquire(self, max_wait=0.0):
+        wait = self.reserve(max_wait)
+        if wait is None:
+            return False
+        if wait:
+            self.waiting += 1
+            try:
+                time.sleep(wait)
+            finally:
+                self.waiting -= 1
+        return True
+
+    async def acquire_async(self, max_wait=0.0):
+        wait = self.reserve(max_wait)
+        if wait is None:
+            return False
+        if wait:
+            self.waiting += 1
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self.waiting -= 1
+        return True
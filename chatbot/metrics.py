@@ -0,0 +1,186 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond local answers up to slow Gemini calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple((name, labels[name]) for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class _HistogramSeries:
+    __slots__ = ('counts', 'sum', 'count', 'window')
+
+    def __init__(self, buckets, window):
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.window = deque(maxlen=window)
+
+
+class Histogram:
+    """Prometheus histogram, plus p50/p95/p99 over the most recent `window` observations
+    (exported as a separate <name>_quantile gauge family)."""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS, window=2048):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.window = window
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(self.buckets, self.window)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series.counts[i] += 1
+                    break
+            series.sum += value
+            series.count += 1
+            series.window.append(value)
+
+    def quantile(self, q, **labels):
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            values = sorted(series.window) if series else []
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        quantile_lines = [f"# HELP {self.name}_quantile {self.help} (recent window quantiles)",
+                          f"# TYPE {self.name}_quantile gauge"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series.counts):
+                    cumulative += count
+                    labels = _format_labels(key + (("le", _format_value(bound)),))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {series.count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series.sum)}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series.count}")
+                values = sorted(series.window)
+                for q in QUANTILES:
+                    value = values[min(len(values) - 1, int(q * len(values)))]
+                    labels = _format_labels(key + (("quantile", str(q)),))
+                    quantile_lines.append(f"{self.name}_quantile{labels} {_format_value(value)}")
+        return lines + quantile_lines
+
+
+class Gauge:
+    """Gauge read from a callback at scrape time; the callback returns a number or a
+    {label value: number} dict when the gauge has a single label."""
+
+    def __init__(self, name, help_text, read, labelname=None):
+        self.name = name
+        self.help = help_text
+        self.read = read
+        self.labelname = labelname
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        value = self.read()
+        if self.labelname is None:
+            lines.append(f"{self.name} {_format_value(value)}")
+        else:
+            for label, item in sorted(value.items()):
+                lines.append(f"{self.name}{_format_labels(((self.labelname, label),))} {_format_value(item)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name, help_text, read, labelname=None):
+        return self._add(Gauge(name, help_text, read, labelname))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """Times the named stages of one request: ``with timer.stage("upstream"): ...``."""
+
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self.started = clock()
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + self._clock() - start
+
+    @property
+    def total(self):
+        return self._clock() - self.started
+
+    def breakdown(self):
+        return " ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in self.stages.items())
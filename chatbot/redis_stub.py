@@ -0,0 +1,137 @@
+"""Local stand-in for Redis, speaking enough of its protocol for RedisBackend.
+
+    python -m chatbot.redis_stub --port 6379
+    STATE_BACKEND=redis://127.0.0.1:6379/0 gunicorn -w 4 app:app
+
+Supports PING, AUTH, SELECT, GET, MGET, SET (EX/PX), DEL, SCAN, DBSIZE and FLUSHDB, all
+in memory, so shared-state deployments can be tried without installing Redis.
+"""
+import argparse
+import fnmatch
+import socketserver
+import threading
+import time
+
+
+class StubRedisStore:
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def execute(self, command, args):
+        now = self._clock()
+        with self._lock:
+            if command in (b"PING",):
+                return b"+PONG"
+            if command in (b"AUTH", b"SELECT"):
+                return b"+OK"
+            if command == b"GET":
+                entry = self._live(args[0], now)
+                return entry[0] if entry else None
+            if command == b"MGET":
+                return [entry[0] if entry else None for entry in (self._live(key, now) for key in args)]
+            if command == b"SET":
+                expires = None
+                options = [arg.upper() for arg in args[2:]]
+                if b"EX" in options:
+                    expires = now + int(args[2 + options.index(b"EX") + 1])
+                elif b"PX" in options:
+                    expires = now + int(args[2 + options.index(b"PX") + 1]) / 1000
+                self._data[args[0]] = (args[1], expires)
+                return b"+OK"
+            if command == b"DEL":
+                return sum(1 for key in args if self._data.pop(key, None) is not None)
+            if command == b"SCAN":
+                # Everything in one page: the cursor is always "0" afterwards
+                options = [arg.upper() for arg in args]
+                pattern = args[options.index(b"MATCH") + 1].decode() if b"MATCH" in options else "*"
+                keys = [key for key in list(self._data)
+                        if self._live(key, now) and fnmatch.fnmatchcase(key.decode(), pattern)]
+                return [b"0", keys]
+            if command == b"DBSIZE":
+                return sum(1 for key in list(self._data) if self._live(key, now))
+            if command == b"FLUSHDB":
+                self._data.clear()
+                return b"+OK"
+        return ValueError(f"unknown command '{command.decode(errors='replace')}'")
+
+
+def encode_reply(reply):
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, ValueError):
+        return b"-ERR " + str(reply).encode() + b"\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(encode_reply(item) for item in reply)
+    if reply.startswith(b"+"):
+        return reply + b"\r\n"
+    return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()  # inline command, e.g. from telnet
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            if not args:
+                continue
+            reply = self.server.store.execute(args[0].upper(), args[1:])
+            self.wfile.write(encode_reply(reply))
+
+
+class StubRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), _Handler)
+        self.store = StubRedisStore()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        """Serve in a background thread; returns the port (useful with port=0)."""
+        threading.Thread(target=self.serve_forever, name="redis-stub", daemon=True).start()
+        return self.port
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory Redis stand-in for local testing.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+    server = StubRedisServer(args.host, args.port)
+    print(f"Redis stand-in listening on {args.host}:{server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
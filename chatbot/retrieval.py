@@ -0,0 +1,90 @@
+import math
+import re
+from collections import Counter
+
+from chatbot.intents import FILLER_WORDS
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Words that carry no meaning for picking a knowledge base section
+STOPWORDS = frozenset("""
+a about all also am an and any are as at be been but by can could do does did for from get
+give go had has have he her here hi hello him his how i if in into is it its just know let
+me more my no not of on or our please she so some tell than thank thanks that the their them
+then there these they this to us want was we were what when where which who why will with
+would you your yours
+""".split()) | FILLER_WORDS | frozenset("""
+year years make makes like take get also still other others over
+""".split())
+
+# Endings stripped before stemming, longest first; a stem keeps at least 3 letters
+_SUFFIXES = ("ments", "ment", "ings", "ing", "ions", "ion", "able", "ers", "er",
+             "ies", "ees", "ed", "es", "ee", "s", "e")
+
+
+def _stem(word):
+    # Strip one ending, then keep 6 letters: "located"/"location" and "requirements"/"required"
+    # share a stem, "transfer"/"transcript" don't
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith("ss"):
+            word = word[:-len(suffix)]
+            break
+    return word[:6]
+
+
+def tokenize(text):
+    return [_stem(word) for word in _WORD_RE.findall(text.lower()) if word not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of documents, built once and queried per request."""
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+        lengths = []
+        postings = {}
+        self._terms = []
+        for doc_id, document in enumerate(documents):
+            counts = Counter(tokenize(document))
+            lengths.append(sum(counts.values()))
+            self._terms.append(frozenset(counts))
+            for term, freq in counts.items():
+                postings.setdefault(term, []).append((doc_id, freq))
+        average = (sum(lengths) / len(lengths)) if lengths else 0.0
+        self._norms = [k1 * (1 - b + b * (length / average if average else 0)) for length in lengths]
+        self._postings = {}
+        for term, entries in postings.items():
+            idf = math.log(1 + (self.size - len(entries) + 0.5) / (len(entries) + 0.5))
+            self._postings[term] = tuple((doc_id, freq, idf) for doc_id, freq in entries)
+        self._idf = {term: entries[0][2] for term, entries in self._postings.items()}
+        # A query word found in no document is as specific as a word can be
+        self._unknown_idf = math.log(1 + (self.size + 0.5) / 0.5)
+
+    def scores(self, query):
+        """Return {doc_id: score} for every document sharing a term with the query."""
+        scores = {}
+        for term in set(tokenize(query)):
+            for doc_id, freq, idf in self._postings.get(term, ()):
+                weight = idf * freq * (self.k1 + 1) / (freq + self._norms[doc_id])
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight
+        return scores
+
+    def search(self, query, top_k):
+        """Best matching (doc_id, score) pairs, highest score first."""
+        ranked = sorted(self.scores(query).items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:top_k]
+
+    def coverage(self, query, doc_ids):
+        """Share of the query's terms, weighted by IDF, that the documents contain (0.0 to 1.0).
+
+        BM25 scores are not comparable across queries, so this is what says whether the matches
+        answer the question: "teachers ... special" matching only "special" covers little.
+        """
+        terms = set(tokenize(query))
+        total = sum(self._idf.get(term, self._unknown_idf) for term in terms)
+        if not total:
+            return 0.0
+        found = frozenset().union(*(self._terms[doc_id] for doc_id in doc_ids))
+        return sum(self._idf[term] for term in terms & found) / total
@@ -0,0 +1,110 @@
+import secrets
+import time
+
+from chatbot.context import estimate_tokens
+from chatbot.state import MemoryBackend, StateError
+
+# Backend key prefix for session records
+SESSION_PREFIX = "session:"
+
+
+def new_session_id():
+    return secrets.token_urlsafe(16)
+
+
+def _pair_tokens(pair):
+    return estimate_tokens(pair[0]) + estimate_tokens(pair[1])
+
+
+def _history(record):
+    # Records keep compact [user, model] text pairs; Gemini wants role/parts entries
+    history = []
+    for user_text, model_text in record["pairs"]:
+        history.append({"role": "user", "parts": [user_text]})
+        history.append({"role": "model", "parts": [model_text]})
+    return history
+
+
+class SessionStore:
+    """Per-visitor chat history with idle expiry and a turn/token cap.
+
+    Sessions live in a StateBackend: an in-process LRU by default, or a SQLite/Redis backend
+    so every worker sees the same history. History entries use the Gemini history format
+    ({"role": ..., "parts": [text]}) so they can be passed straight to model.start_chat().
+    If the backend is unreachable the visitor simply gets a fresh conversation.
+    """
+
+    def __init__(self, max_sessions=5000, idle_ttl=1800, max_turns=10, max_tokens=6000,
+                 clock=time.monotonic, backend=None):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.backend = backend or MemoryBackend(max_entries=max_sessions, clock=clock)
+        self.truncated_turns = 0
+        self.errors = 0
+
+    def __len__(self):
+        try:
+            return self.backend.count(SESSION_PREFIX)
+        except StateError:
+            return 0
+
+    @property
+    def evicted(self):
+        return getattr(self.backend, 'evictions', 0)
+
+    def _load(self, session_ids):
+        try:
+            return self.backend.get_many([SESSION_PREFIX + session_id for session_id in session_ids])
+        except StateError as e:
+            self.errors += 1
+            print(f"Session store unavailable: {e}")
+            return [None] * len(session_ids)
+
+    def history(self, session_id):
+        """Copy of the session's history (empty for new or expired sessions)."""
+        return self.histories([session_id])[0]
+
+    def histories(self, session_ids):
+        """History of several sessions with a single backend lookup."""
+        return [_history(record) if record else [] for record in self._load(session_ids)]
+
+    def append(self, session_id, user_text, model_text):
+        """Record one exchange, dropping the oldest exchanges beyond the turn/token caps."""
+        self.append_many([(session_id, user_text, model_text)])
+
+    def append_many(self, exchanges):
+        """Record (session_id, user_text, model_text) exchanges with one read and one write."""
+        session_ids = list(dict.fromkeys(session_id for session_id, _, _ in exchanges))
+        records = {session_id: record or {"pairs": [], "tokens": 0}
+                   for session_id, record in zip(session_ids, self._load(session_ids))}
+        for session_id, user_text, model_text in exchanges:
+            record = records[session_id]
+            pair = [user_text, model_text]
+            # Build a new record: the memory backend hands out the stored object itself
+            records[session_id] = self._truncate(
+                {"pairs": record["pairs"] + [pair], "tokens": record["tokens"] + _pair_tokens(pair)})
+        try:
+            self.backend.set_many({SESSION_PREFIX + session_id: record for session_id, record in records.items()},
+                                  ttl=self.idle_ttl)
+        except StateError as e:
+            self.errors += 1
+            print(f"Session store unavailable: {e}")
+
+    def reset(self, session_id):
+        try:
+            self.backend.delete(SESSION_PREFIX + session_id)
+        except StateError as e:
+            print(f"Session store unavailable: {e}")
+
+    def _truncate(self, record):
+        # Always keep the latest exchange, even if it alone is over the token cap
+        pairs, tokens = record["pairs"], record["tokens"]
+        dropped = 0
+        while len(pairs) - dropped > 1 and (
+                len(pairs) - dropped > self.max_turns or tokens > self.max_tokens):
+            tokens -= _pair_tokens(pairs[dropped])
+            dropped += 1
+        self.truncated_turns += dropped
+        return {"pairs": pairs[dropped:], "tokens": tokens} if dropped else record
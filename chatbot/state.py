@@ -0,0 +1,355 @@
+"""Key/value backends for state that several workers should share (chat history, cached answers).
+
+    STATE_BACKEND=memory                      per-process (default)
+    STATE_BACKEND=sqlite:////var/tmp/olfu.db  one SQLite file shared by the workers on a node
+    STATE_BACKEND=redis://localhost:6379/0    Redis or anything speaking its protocol
+
+Values are JSON-serializable and stored as compact JSON by the shared backends. Every backend
+has bulk get_many/set_many so a request (or a batch of them) needs one round trip per direction.
+"""
+import json
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import unquote, urlparse
+
+
+class StateError(Exception):
+    """The state backend could not be reached or answered with an error."""
+
+
+def encode(value):
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def decode(data):
+    return None if data is None else json.loads(data)
+
+
+class StateBackend:
+    """get/set with an optional TTL in seconds, their bulk forms, delete, clear and count."""
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, items, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self, prefix=""):
+        raise NotImplementedError
+
+    def count(self, prefix=""):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryBackend(StateBackend):
+    """In-process LRU with per-key expiry. Values are kept as given (not serialized), so
+    callers must not mutate what they store or get back."""
+
+    def __init__(self, max_entries=10000, sweep_interval=60.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._next_sweep = clock() + sweep_interval
+        self.evictions = 0
+
+    def get_many(self, keys):
+        now = self._clock()
+        values = []
+        with self._lock:
+            self._sweep(now)
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] is not None and entry[1] <= now:
+                    del self._entries[key]
+                    self.evictions += 1
+                    entry = None
+                if entry is None:
+                    values.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    values.append(entry[0])
+        return values
+
+    def set_many(self, items, ttl=None):
+        now = self._clock()
+        expires = now + ttl if ttl else None
+        with self._lock:
+            self._sweep(now)
+            for key, value in items.items():
+                self._entries[key] = (value, expires)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self, prefix=""):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def count(self, prefix=""):
+        with self._lock:
+            if not prefix:
+                return len(self._entries)
+            return sum(1 for key in self._entries if key.startswith(prefix))
+
+    def _sweep(self, now):
+        # Drop expired entries that are never read again, at most once per sweep_interval
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval
+        expired = [key for key, (_, expires) in self._entries.items() if expires is not None and expires <= now]
+        for key in expired:
+            del self._entries[key]
+        self.evictions += len(expired)
+
+
+class SQLiteBackend(StateBackend):
+    """State in one SQLite file (WAL mode), shared by every worker process on the machine."""
+
+    # SQLite limits the number of bound parameters per statement
+    CHUNK = 500
+
+    def __init__(self, path, sweep_interval=60.0, clock=time.time):
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        self._local = threading.local()
+        self._next_sweep = 0.0
+        self._run(lambda conn: conn.execute(
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"))
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _run(self, operation):
+        try:
+            return operation(self._connection())
+        except sqlite3.Error as e:
+            raise StateError(f"SQLite state backend: {e}") from e
+
+    def get_many(self, keys):
+        keys = list(keys)
+        now = self._clock()
+
+        def select(conn):
+            found = {}
+            for i in range(0, len(keys), self.CHUNK):
+                chunk = keys[i:i + self.CHUNK]
+                found.update(conn.execute(
+                    f"SELECT key, value FROM state WHERE key IN ({','.join('?' * len(chunk))}) "
+                    "AND (expires IS NULL OR expires > ?)", (*chunk, now)))
+            return found
+
+        found = self._run(select) if keys else {}
+        return [decode(found.get(key)) for key in keys]
+
+    def set_many(self, items, ttl=None):
+        now = self._clock()
+        expires = now + ttl if ttl else None
+        rows = [(key, encode(value), expires) for key, value in items.items()]
+
+        def write(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("INSERT OR REPLACE INTO state (key, value, expires) VALUES (?, ?, ?)", rows)
+                if now >= self._next_sweep:
+                    self._next_sweep = now + self.sweep_interval
+                    conn.execute("DELETE FROM state WHERE expires <= ?", (now,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        self._run(write)
+
+    def delete(self, key):
+        self._run(lambda conn: conn.execute("DELETE FROM state WHERE key = ?", (key,)))
+
+    def clear(self, prefix=""):
+        self._run(lambda conn: conn.execute(
+            "DELETE FROM state WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)))
+
+    def count(self, prefix=""):
+        return self._run(lambda conn: conn.execute(
+            "SELECT COUNT(*) FROM state WHERE substr(key, 1, ?) = ? AND (expires IS NULL OR expires > ?)",
+            (len(prefix), prefix, self._clock())).fetchone()[0])
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class RedisBackend(StateBackend):
+    """Speaks the Redis protocol (RESP) over a plain socket, one connection per thread, so no
+    client library is needed. Works with Redis, Valkey or the stand-in in chatbot.redis_stub.
+    Keys are namespaced with `prefix` so clear() never touches other applications' data."""
+
+    def __init__(self, host='127.0.0.1', port=6379, db=0, password=None, socket_timeout=1.0,
+                 prefix="olfu:"):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.socket_timeout = socket_timeout
+        self.prefix = prefix
+        self._local = threading.local()
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        parsed = urlparse(url)
+        db = parsed.path.lstrip('/')
+        return cls(host=parsed.hostname or '127.0.0.1', port=parsed.port or 6379,
+                   db=int(db) if db else 0,
+                   password=unquote(parsed.password) if parsed.password else None, **kwargs)
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.socket_timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock, self._local.reader = sock, sock.makefile('rb')
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            self._send(setup)
+
+    def _disconnect(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = self._local.reader = None
+
+    @staticmethod
+    def _pack(command):
+        parts = [b"*%d\r\n" % len(command)]
+        for arg in command:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def _read_reply(self):
+        line = self._local.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed by the state server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            return StateError(rest.decode('utf-8', 'replace'))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise StateError(f"unexpected reply from the state server: {line!r}")
+
+    def _send(self, commands):
+        self._local.sock.sendall(b"".join(self._pack(command) for command in commands))
+        replies = [self._read_reply() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, StateError):
+                raise reply
+        return replies
+
+    def execute(self, *commands):
+        """Send the commands as one pipeline and return their replies; reconnects once."""
+        for attempt in range(2):
+            try:
+                if getattr(self._local, 'sock', None) is None:
+                    self._connect()
+                return self._send(commands)
+            except StateError:
+                raise
+            except (OSError, ValueError) as e:
+                self._disconnect()
+                if attempt:
+                    raise StateError(f"Redis state backend at {self.host}:{self.port}: {e}") from e
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return []
+        values, = self.execute(("MGET", *[self.prefix + key for key in keys]))
+        return [decode(value) for value in values]
+
+    def set_many(self, items, ttl=None):
+        if not items:
+            return
+        expiry = ("PX", int(ttl * 1000)) if ttl else ()
+        self.execute(*[("SET", self.prefix + key, encode(value), *expiry) for key, value in items.items()])
+
+    def delete(self, key):
+        self.execute(("DEL", self.prefix + key))
+
+    def _scan(self, prefix):
+        cursor, pattern = b"0", self.prefix + prefix + "*"
+        while True:
+            (cursor, keys), = self.execute(("SCAN", cursor, "MATCH", pattern, "COUNT", 1000))
+            yield keys
+            if cursor == b"0":
+                return
+
+    def clear(self, prefix=""):
+        for keys in self._scan(prefix):
+            if keys:
+                self.execute(("DEL", *keys))
+
+    def count(self, prefix=""):
+        return sum(len(keys) for keys in self._scan(prefix))
+
+    def close(self):
+        self._disconnect()
+
+
+def create_backend(url):
+    """Shared backend for a STATE_BACKEND setting, or None to keep state in each process."""
+    if not url or url == "memory":
+        return None
+    scheme = urlparse(url).scheme
+    if scheme == "sqlite":
+        # sqlite:///relative.db or sqlite:////absolute/path.db
+        return SQLiteBackend(url[len("sqlite:///"):] or "state.db")
+    if scheme == "redis":
+        return RedisBackend.from_url(url)
+    raise ValueError(f"Unsupported STATE_BACKEND: {url}")
@@ -0,0 +1,88 @@
+import asyncio
+import random
+import time
+from collections import deque
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubError(Exception):
+    """Injected upstream failure; carries a 503 code so it is retried like a real Gemini outage."""
+
+    code = 503
+
+
+class StubChat:
+    """Stands in for genai.ChatSession: sleeps like Gemini would, then returns a canned answer."""
+
+    def __init__(self, model, history):
+        self.model = model
+        self.history = list(history or [])
+
+    def _reply(self, content):
+        self.model.calls += 1
+        # Size of what Gemini would receive this turn: the replayed history plus the new prompt
+        history_bytes = sum(len(str(part).encode('utf-8'))
+                            for message in self.history for part in message.get('parts', []))
+        self.model.prompts.append((len(self.history), history_bytes + len(str(content).encode('utf-8'))))
+        if self.model.error_rate and random.random() < self.model.error_rate:
+            raise StubError("stub upstream error")
+        question = str(content).rsplit("User question:", 1)[-1].strip()
+        return f"(stub answer #{self.model.calls}) You asked: {question}"
+
+    def _chunks(self, text):
+        words = text.split(" ")
+        return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+    def _generation_seconds(self, text):
+        # A whole answer arrives when its last chunk would have been streamed
+        return len(self._chunks(text)) * self.model.token_delay
+
+    def send_message(self, content, stream=False, **kwargs):
+        time.sleep(self.model.latency)
+        text = self._reply(content)
+        if not stream:
+            time.sleep(self._generation_seconds(text))
+            return StubResponse(text)
+        return self._stream(text)
+
+    def _stream(self, text):
+        for chunk in self._chunks(text):
+            time.sleep(self.model.token_delay)
+            yield StubResponse(chunk)
+
+    async def send_message_async(self, content, stream=False, **kwargs):
+        await asyncio.sleep(self.model.latency)
+        text = self._reply(content)
+        if not stream:
+            await asyncio.sleep(self._generation_seconds(text))
+            return StubResponse(text)
+        return self._stream_async(text)
+
+    async def _stream_async(self, text):
+        for chunk in self._chunks(text):
+            await asyncio.sleep(self.model.token_delay)
+            yield StubResponse(chunk)
+
+
+class StubModel:
+    """Local replacement for genai.GenerativeModel, used for load tests (GEMINI_STUB=1).
+
+    latency is the time to the first token; tokens_per_second is the generation rate, pacing
+    streamed chunks and delaying whole answers by the time they take to generate; error_rate
+    is the fraction of calls that fail with StubError. The last `keep_prompts` calls are kept in
+    `prompts` as (history messages, prompt bytes) for the benchmark harness.
+    """
+
+    def __init__(self, latency=0.8, tokens_per_second=50.0, error_rate=0.0, keep_prompts=10000):
+        self.latency = latency
+        self.token_delay = 1.0 / tokens_per_second if tokens_per_second else 0.0
+        self.error_rate = error_rate
+        self.calls = 0
+        self.prompts = deque(maxlen=keep_prompts)
+
+    def start_chat(self, history=None):
+        return StubChat(self, history)
@@ -0,0 +1,264 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from chatbot.limits import TokenBucket
+
+# HTTP status codes (google.api_core exceptions carry them as .code) worth retrying
+RETRYABLE_STATUS = frozenset([429, 500, 502, 503, 504])
+
+
+class UpstreamUnavailable(Exception):
+    """Gemini can't be called right now; callers should fall back to a local answer."""
+
+
+class CircuitOpen(UpstreamUnavailable):
+    pass
+
+
+class RateLimited(UpstreamUnavailable):
+    pass
+
+
+class UpstreamTimeout(UpstreamUnavailable):
+    pass
+
+
+def is_retryable(error):
+    if isinstance(error, (UpstreamTimeout, TimeoutError, ConnectionError)):
+        return True
+    return getattr(error, 'code', None) in RETRYABLE_STATUS
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and fails fast for `reset_timeout`
+    seconds, then lets a single trial call through (half-open) to decide whether to close."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._trial_running = False
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def release(self):
+        """Give back a trial slot from allow() when the call was never made."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+
+class GeminiClient:
+    """Wraps ChatSession.send_message with rate limiting, a timeout, retries and a breaker.
+
+    Each attempt takes a token from the rate limiter (waiting up to queue_timeout), runs with
+    a `timeout`-second deadline, and is retried with full-jitter exponential backoff when the
+    error is retryable (rate limits, 5xx, timeouts). Failures feed the circuit breaker; while
+    it is open calls raise CircuitOpen immediately.
+
+    A streamed answer returns after its first chunk; read the rest through stream() or
+    stream_async(), which allow `chunk_timeout` seconds per chunk and count a stalled or failed
+    stream against the breaker (it can't be retried once the visitor has part of the answer).
+    """
+
+    def __init__(self, rate=10.0, burst=20, queue_timeout=5.0, timeout=30.0, max_retries=2,
+                 base_delay=0.5, max_delay=8.0, breaker=None, max_workers=64, chunk_timeout=15.0):
+        self.limiter = TokenBucket(rate, burst)
+        self.breaker = breaker or CircuitBreaker()
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.chunk_timeout = chunk_timeout
+        # Blocking SDK calls run here so a hung call can be abandoned at the deadline
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini")
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.short_circuited = 0
+        self.rate_limited = 0
+
+    def stats(self):
+        return {
+            "breaker_state": self.breaker.state,
+            "queue_depth": self.limiter.waiting,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "short_circuited": self.short_circuited,
+            "rate_limited": self.rate_limited,
+        }
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _started(self):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+
+    def _ended(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            self.short_circuited += 1
+            raise CircuitOpen("Gemini circuit breaker is open")
+
+    def _finish(self, error, attempt):
+        """Record a failed attempt; returns True when it should be retried."""
+        self.failures += 1
+        retryable = is_retryable(error)
+        if retryable:
+            self.breaker.record_failure()
+        else:
+            # The upstream answered (e.g. a blocked prompt); that says nothing about its health
+            self.breaker.record_success()
+        return retryable and attempt < self.max_retries
+
+    @staticmethod
+    def _give_up(error):
+        # Out of retries on an upstream outage: surface it as UpstreamUnavailable for fallbacks
+        if is_retryable(error) and not isinstance(error, UpstreamUnavailable):
+            unavailable = UpstreamUnavailable(f"Gemini unavailable: {error}")
+            unavailable.__cause__ = error
+            return unavailable
+        return error
+
+    def send_message(self, chat, content, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self._check_breaker()
+            if not self.limiter.acquire(self.queue_timeout):
+                self.rate_limited += 1
+                self.breaker.release()
+                raise RateLimited("Gemini rate limit queue is full")
+            self._started()
+            future = self._executor.submit(chat.send_message, content, **kwargs)
+            try:
+                response = future.result(timeout=self.timeout)
+            except FutureTimeout:
+                future.cancel()
+                self.timeouts += 1
+                error = UpstreamTimeout(f"Gemini did not answer within {self.timeout}s")
+            except Exception as e:
+                error = e
+            else:
+                self.breaker.record_success()
+                return response
+            finally:
+                self._ended()
+            if not self._finish(error, attempt):
+                raise self._give_up(error)
+            self.retries += 1
+            time.sleep(self.backoff(attempt))
+
+    async def send_message_async(self, chat, content, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self._check_breaker()
+            if not await self.limiter.acquire_async(self.queue_timeout):
+                self.rate_limited += 1
+                self.breaker.release()
+                raise RateLimited("Gemini rate limit queue is full")
+            self._started()
+            try:
+                response = await asyncio.wait_for(chat.send_message_async(content, **kwargs),
+                                                  self.timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                error = UpstreamTimeout(f"Gemini did not answer within {self.timeout}s")
+            except Exception as e:
+                error = e
+            else:
+                self.breaker.record_success()
+                return response
+            finally:
+                self._ended()
+            if not self._finish(error, attempt):
+                raise self._give_up(error)
+            self.retries += 1
+            await asyncio.sleep(self.backoff(attempt))
+
+    def _stream_failed(self, error):
+        self._finish(error, self.max_retries)
+        return self._give_up(error)
+
+    def stream(self, response):
+        """The chunks of a streamed response, each read under the chunk_timeout deadline."""
+        chunks = iter(response)
+        done = object()
+        while True:
+            future = self._executor.submit(next, chunks, done)
+            try:
+                chunk = future.result(timeout=self.chunk_timeout)
+            except FutureTimeout:
+                self.timeouts += 1
+                raise self._stream_failed(UpstreamTimeout(
+                    f"Gemini stream stalled for {self.chunk_timeout}s")) from None
+            except Exception as e:
+                raise self._stream_failed(e) from e
+            if chunk is done:
+                return
+            yield chunk
+
+    async def stream_async(self, response):
+        chunks = response.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), self.chunk_timeout)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise self._stream_failed(UpstreamTimeout(
+                    f"Gemini stream stalled for {self.chunk_timeout}s")) from None
+            except Exception as e:
+                raise self._stream_failed(e) from e
+            yield chunk
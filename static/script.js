@@ -293,14 +293,100 @@ function addMessage(message, isUser = false, timestamp = null) {
 }
 
 // Function to clear chat history
-function clearChatHistory() {
+async function clearChatHistory() {
     if (confirm('Are you sure you want to clear your chat history?')) {
         localStorage.removeItem('olfuChatHistory');
+        try {
+            // Forget the conversation on the server too, so it isn't sent to Gemini again
+            await fetch('/api/chat/reset', { method: 'POST' });
+        } catch (error) {
+            console.warn('Could not reset the chat session:', error);
+        }
         // Reload the page to start fresh
         window.location.reload();
     }
 }
 
+// Split a Server-Sent Events block into its event name and JSON data
+function parseServerEvent(rawEvent) {
+    let type = 'message';
+    let data = '';
+    rawEvent.split('\n').forEach(line => {
+        if (line.startsWith('event:')) {
+            type = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            data += line.slice(5).trim();
+        }
+    });
+    return { type, data: data ? JSON.parse(data) : {} };
+}
+
+// Show the answer as it streams in from /api/chat/stream; resolves with the full text
+async function streamBotResponse(message) {
+    const response = await fetch('/api/chat/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ message })
+    });
+    if (response.status === 429 || response.status === 413) {
+        // Refused by the server's limits: show its message instead of retrying without streaming
+        return (await response.json()).response;
+    }
+    if (!response.ok || !response.body) {
+        throw new Error('Streaming is not available');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+    let previewDiv = null;
+
+    try {
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const event = parseServerEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+
+                if (event.type === 'chunk') {
+                    if (!previewDiv) {
+                        removeTypingIndicator();
+                        // Temporary bubble; marked as processed so the highlight/list scripts skip it
+                        previewDiv = document.createElement('div');
+                        previewDiv.classList.add('message', 'bot-message', 'streaming-message');
+                        previewDiv.dataset.processed = 'true';
+                        previewDiv.dataset.emojiProcessed = 'true';
+                        previewDiv.dataset.listProcessed = 'true';
+                        chatBody.appendChild(previewDiv);
+                    }
+                    text += event.data.text;
+                    previewDiv.innerHTML = text.replace(/\n/g, '<br>');
+                    chatBody.scrollTop = chatBody.scrollHeight;
+                } else if (event.type === 'done') {
+                    text += event.data.addons || '';
+                } else if (event.type === 'error') {
+                    text = event.data.response;
+                }
+            }
+        }
+    } finally {
+        // Swap the preview for a regular message so it is formatted and saved like any other
+        if (previewDiv) {
+            previewDiv.remove();
+        }
+    }
+    return text;
+}
+
 // Modify your sendMessage function to include the updated addMessage
 async function sendMessage(message) {
     addMessage(message, true);
@@ -309,17 +395,24 @@ async function sendMessage(message) {
     showTypingIndicator();
 
     try {
-        const response = await fetch('/api/chat', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ message })
-        });
+        let botResponse;
+        try {
+            botResponse = await streamBotResponse(message);
+        } catch (streamError) {
+            // Fall back to the regular endpoint if streaming isn't supported
+            console.warn('Streaming failed, retrying without it:', streamError);
+            const response = await fetch('/api/chat', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ message })
+            });
+            botResponse = (await response.json()).response;
+        }
 
-        const data = await response.json();
         removeTypingIndicator();
-        addMessage(data.response);
+        addMessage(botResponse);
     } catch (error) {
         console.error('Error:', error);
         removeTypingIndicator();